@@ -1,7 +1,7 @@
-from flask import Flask
-from flask_graphql import GraphQLView
+from flask import Flask, jsonify
 from graphene import Schema
 
+from src.cache import CachedGraphQLView, response_cache
 from src.schema import Query
 
 app = Flask(__name__)
@@ -13,7 +13,12 @@ def hello_world():
     return "Hello, World!"
 
 
-app.add_url_rule("/", view_func=GraphQLView.as_view("graphql", schema=schema, graphiql=True))
+@app.route("/cache")
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+
+app.add_url_rule("/", view_func=CachedGraphQLView.as_view("graphql", schema=schema, graphiql=True))
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
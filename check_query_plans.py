@@ -0,0 +1,110 @@
+import re
+import sqlite3
+import sys
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.database import (
+    CampusEatery,
+    CampusEateryClosure,
+    CampusEateryHour,
+    CampusEateryRule,
+    CollegetownEatery,
+    CollegetownEateryRule,
+)
+from src.db import get_connection
+from src.gql_parser import campus_eatery_criteria, collegetown_eatery_criteria
+from src.gql_parser.campus_eatery import (
+    get_campus_eateries,
+    parse_expanded_menus,
+    parse_operating_hours,
+    parse_swipe_data,
+)
+from src.gql_parser.collegetown_eatery import get_collegetown_eateries, parse_collegetown_hours
+from src.gql_parser.common_eatery import fetch_ids, fetch_schedules, parse_date_range, parse_open_intervals
+from src.gql_parser.snapshot import get_current_generation
+from src.gql_types import PaymentMethodsEnum
+
+# the eatery tables are loaded whole into every snapshot, and filtered on columns no index would help with
+SCANNED_TABLES = ["campusEateries", "collegetownEateries"]
+IN_LIST = re.compile(r"IN \(((?:\?, )*\?)\)")
+
+statements = {}
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    if not statement.startswith("EXPLAIN"):
+        statement, parameters = single_key(statement, parameters)
+        statements.setdefault(statement, parameters)
+
+
+def single_key(statement, parameters):
+    """Shrinks every IN list of a statement to its first value.
+
+    The snapshot loads every eatery at once, and for lookups that cover most of a table sqlite rightly prefers a scan,
+    so plans are checked for the lookup of a single key, which is what a missing index would slow down.
+
+    Returns a tuple of the rewritten statement and its parameters.
+    """
+    parameters = list(parameters)
+    for match in reversed(list(IN_LIST.finditer(statement))):
+        start, end = match.span()
+        first = statement.count("?", 0, start) + 1
+        last = first + match.group(1).count("?") - 1
+        del parameters[first:last]
+        statement = statement[:start] + "IN (?)" + statement[end:]
+    return statement, tuple(parameters)
+
+
+def copy_schema(conn):
+    """Copies the tables and indexes of the db of conn, without their rows or the statistics ANALYZE stored.
+
+    With statistics, sqlite rightly scans tables that are small, or whose rows mostly share a key, even where an index
+    exists, so plans are checked against the schema alone: a scan there means no index can serve the statement.
+
+    Returns a connection to an in-memory copy of the schema.
+    """
+    schema = sqlite3.connect(":memory:")
+    rows = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'")
+    for (sql,) in rows:
+        schema.execute(sql)
+    return schema
+
+
+print("Running read path statements")
+get_current_generation()
+# with no eateries, the loaders run no statements, so a placeholder id makes them run the lookups for a single key
+campus_ids = [eatery.id for eatery in get_campus_eateries(None)] or [0]
+ctown_ids = [eatery.id for eatery in get_collegetown_eateries(None)] or [0]
+date_range = parse_date_range(days=1)
+
+parse_expanded_menus(campus_ids)
+parse_expanded_menus(campus_ids, with_items=False)
+parse_operating_hours(campus_ids)
+parse_operating_hours(campus_ids, *date_range)
+parse_swipe_data(campus_ids)
+parse_open_intervals(campus_ids, CampusEateryHour, fetch_schedules(CampusEateryRule, campus_ids, CampusEateryClosure))
+parse_collegetown_hours(ctown_ids)
+parse_collegetown_hours(ctown_ids, *date_range)
+parse_open_intervals(ctown_ids, schedules=fetch_schedules(CollegetownEateryRule, ctown_ids))
+fetch_ids(
+    CampusEatery,
+    campus_eatery_criteria(campus_area="Central", payment_methods=[PaymentMethodsEnum.SWIPES], is_get=True),
+)
+fetch_ids(CollegetownEatery, collegetown_eatery_criteria(payment_methods=[PaymentMethodsEnum.CASH], price="$"))
+
+event.remove(Engine, "before_cursor_execute", record_statement)
+schema = copy_schema(get_connection())
+failed = False
+for statement, parameters in statements.items():
+    plan = schema.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    scans = [row[-1] for row in plan if row[-1].startswith("SCAN") and row[-1].split()[1] not in SCANNED_TABLES]
+    if scans:
+        failed = True
+        print("Table scan in:", " ".join(statement.split()))
+        for scan in scans:
+            print("   ", scan)
+
+print("{} statements checked, {}".format(len(statements), "table scans found" if failed else "no table scans"))
+sys.exit(1 if failed else 0)
@@ -1,8 +1,19 @@
+import os
+
+from src.constants import DB_POINTER_PATH
+from src.database import dispose_read_engines
 from src.db import start_update
 
 
 def on_starting(server):
-    start_update(True, True, True)
+    # updates are run by schedule_updates.py; only build a db to serve if none has been published yet
+    if not os.path.exists(DB_POINTER_PATH):
+        start_update(True, True, True)
+
+
+def post_fork(server, worker):
+    # connections pooled by the master before the fork must not be used by the workers
+    dispose_read_engines()
 
 
 workers = 4
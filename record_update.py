@@ -0,0 +1,9 @@
+import sys
+
+from src.db import start_update
+from src.fetch import recording
+
+with recording() as path:
+    print("Running full update, recording upstream responses to", path)
+    succeeded = start_update(True, True, True)
+sys.exit(0 if succeeded else 1)
@@ -0,0 +1,16 @@
+import sys
+import time
+
+from src.db import start_update
+from src.fetch import get_latest_recording, replaying
+
+path = sys.argv[1] if len(sys.argv) > 1 else get_latest_recording()
+if path is None:
+    sys.exit("No recording found, run record_update.py first")
+
+with replaying(path):
+    print("Running full update from recording", path)
+    start = time.perf_counter()
+    succeeded = start_update(True, True, True)
+    print("Update took {:.2f}s".format(time.perf_counter() - start))
+sys.exit(0 if succeeded else 1)
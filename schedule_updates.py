@@ -0,0 +1,4 @@
+from src.scheduler import Scheduler, get_jobs
+
+print("Running update scheduler")
+Scheduler(get_jobs()).run_forever()
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+import json
+from threading import Lock
+from time import time
+
+from flask import Response, request
+from flask_graphql import GraphQLView
+from graphql import parse, print_ast
+from graphql.error import GraphQLSyntaxError
+from graphql.language.ast import Field
+from graphql_server import HttpQueryError, get_graphql_params
+
+from .constants import (
+    RESPONSE_CACHE_SIZE,
+    TIME_DEPENDENT_CACHE_PERIOD,
+    TIME_DEPENDENT_FIELDS,
+    UNCACHED_FIELDS,
+    get_today,
+)
+from .gql_parser import get_snapshot
+
+
+class ResponseCache(object):
+    """A bounded LRU cache of encoded GraphQL responses for a single data generation.
+
+    Entries are dropped as soon as a different generation is seen, so responses never outlive the data they were
+    built from.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, generation, key):
+        with self._lock:
+            if generation != self.generation:
+                self._entries.clear()
+                self.generation = generation
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, generation, key, entry):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+
+def selects_field(node, names):
+    """Returns whether a parsed GraphQL document or node selects any field, or passes any argument, with one of the
+    given names.
+    """
+    if isinstance(node, Field) and node.name.value in names:
+        return True
+    if any(argument.name.value in names for argument in getattr(node, "arguments", None) or []):
+        return True
+    for child in getattr(node, "definitions", None) or []:
+        if selects_field(child, names):
+            return True
+    selection_set = getattr(node, "selection_set", None)
+    for selection in selection_set.selections if selection_set else []:
+        if selects_field(selection, names):
+            return True
+    return False
+
+
+class CachedGraphQLView(GraphQLView):
+    """A GraphQLView that serves repeated queries from response_cache.
+
+    Responses are keyed by the normalized query document, its variables and operation name, the data generation
+    they were built from, and the current day, which operating hours expanded from schedules start at. Operations
+    that depend on the current time (TIME_DEPENDENT_FIELDS) are also keyed by the current TIME_DEPENDENT_CACHE_PERIOD.
+    Operations that select a field in UNCACHED_FIELDS, batches and GraphiQL pages are never cached.
+    """
+
+    def dispatch_request(self):
+        key = self.get_cache_key()
+        if key is None:
+            return super(CachedGraphQLView, self).dispatch_request()
+
+        generation = get_snapshot().generation
+        entry = response_cache.get(generation, key)
+        if entry is not None:
+            return Response(entry, status=200, content_type="application/json")
+
+        response = super(CachedGraphQLView, self).dispatch_request()
+        if response.status_code == 200:
+            body = response.get_data()
+            if not json.loads(body).get("errors"):
+                response_cache.put(generation, key, body)
+        return response
+
+    def get_cache_key(self):
+        """Returns the cache key of the current request, or None if its response must not be cached."""
+        if request.method.lower() == "get" and self.should_display_graphiql():
+            return None
+        try:
+            data = self.parse_body()
+            if isinstance(data, list):
+                return None
+            params = get_graphql_params(data, request.args)
+            if not params.query:
+                return None
+            document = parse(params.query)
+        except (HttpQueryError, GraphQLSyntaxError):
+            return None
+
+        if selects_field(document, UNCACHED_FIELDS):
+            return None
+
+        variables = json.dumps(params.variables or {}, sort_keys=True)
+        period = int(time() // TIME_DEPENDENT_CACHE_PERIOD) if selects_field(document, TIME_DEPENDENT_FIELDS) else None
+        return (
+            print_ast(document),
+            variables,
+            params.operation_name,
+            bool(request.args.get("pretty")),
+            get_today().isoformat(),
+            period,
+        )
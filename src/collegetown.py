@@ -1,28 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
 from os import environ
-from time import sleep
+from threading import Lock
+import time
 from yelpapi import YelpAPI
 
-from .constants import YELP_LATITUDE, YELP_LONGITUDE, YELP_QUERY_DELAY, YELP_RADIUS, YELP_RESTAURANT_LIMIT
+from .constants import (
+    YELP_LATITUDE,
+    YELP_LONGITUDE,
+    YELP_MAX_RESULTS,
+    YELP_QUERIES_PER_SECOND,
+    YELP_QUERY_THREADS,
+    YELP_BUSINESS_TTL,
+    YELP_RADIUS,
+    YELP_RESTAURANT_LIMIT,
+    YELP_SEARCH_TTL,
+)
+from .fetch import fetch_with_ttl
 
 yelp_api = YelpAPI(environ.get("YELP_API_KEY"))
 
 
+class TokenBucket(object):
+    """Rate limits calls shared between threads.
+
+    Tokens are added at rate per second, up to capacity, and every call takes one, waiting for it if none is left.
+
+    Args:
+        rate (float): tokens added per second
+        capacity (int): most tokens kept, i.e. the largest burst of calls allowed at once
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def take(self):
+        """Waits until a token is available, then takes it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        # tokens taken ahead of time are negative, so later callers wait behind this one
+        if wait:
+            time.sleep(wait)
+
+
+yelp_bucket = TokenBucket(YELP_QUERIES_PER_SECOND)
+
+
 def collegetown_search():
+    """Queries Yelp for the restaurants around Collegetown.
+
+    Search results are paged through with offset, and the details of each restaurant are then queried from
+    YELP_QUERY_THREADS threads at once, with every query rate limited to YELP_QUERIES_PER_SECOND. Both are cached on
+    disk, for YELP_SEARCH_TTL and YELP_BUSINESS_TTL seconds, so most searches only query the few restaurants whose
+    details expired.
+
+    Returns a list of the Yelp details of each restaurant, in search order, or an empty list if the search failed.
+    """
     try:
+        places = fetch_with_ttl("yelp:search", search_places, YELP_SEARCH_TTL)
+    except Exception as e:
+        print(e)
+        return []
+    with ThreadPoolExecutor(max_workers=YELP_QUERY_THREADS) as executor:
+        eateries = executor.map(query_place, places)
+    return [eatery for eatery in eateries if eatery is not None]
+
+
+def search_places():
+    """Returns a list of the Yelp search results around Collegetown, without duplicates."""
+    places = {}
+    offset = 0
+    total = YELP_RESTAURANT_LIMIT
+    while offset < min(total, YELP_MAX_RESULTS):
+        yelp_bucket.take()
         search = yelp_api.search_query(
-            latitude=YELP_LATITUDE, limit=YELP_RESTAURANT_LIMIT, longitude=YELP_LONGITUDE, radius=YELP_RADIUS
+            latitude=YELP_LATITUDE,
+            limit=min(YELP_RESTAURANT_LIMIT, YELP_MAX_RESULTS - offset),
+            longitude=YELP_LONGITUDE,
+            offset=offset,
+            radius=YELP_RADIUS,
         )
-        eateries = []
+        if not search["businesses"]:
+            break
         for place in search["businesses"]:
-            eatery_id = place["id"]
-            try:
-                id_query = yelp_api.business_query(id=eatery_id)
-                eateries.append(id_query)
-            except Exception as e:
-                print("Error fetching " + place["name"])
-                print(e)
-            sleep(YELP_QUERY_DELAY)  # delay between query calls to not trigger yelp query limits
-        return eateries
+            places.setdefault(place["id"], place)
+        offset += len(search["businesses"])
+        total = search.get("total", 0)
+    return list(places.values())
+
+
+def query_place(place):
+    """Returns the Yelp details of a search result, or None if they couldn't be queried."""
+
+    def query():
+        yelp_bucket.take()
+        return yelp_api.business_query(id=place["id"])
+
+    try:
+        return fetch_with_ttl("yelp:business:" + place["id"], query, YELP_BUSINESS_TTL)
     except Exception as e:
+        print("Error fetching " + place["name"])
         print(e)
-        return []
+        return None
@@ -10,8 +10,23 @@ ACCOUNT_NAMES = {
 BRB_ONLY = "brb_only"
 CORNELL_DINING_URL = "https://now.dining.cornell.edu/api/1.0/dining/eateries.json"
 CORNELL_INSTITUTION_ID = "73116ae4-22ad-4c71-8ffd-11ba015407b1"
+DB_KEPT_FILES = 3  # newest published db files kept on disk, so readers still using an older one can finish
+DB_LOCK_PATH = "data.lock"  # held by the update in progress, so updates from different processes never overlap
+DB_PATH = "data.sqlite3"  # the db readers use until the first update is published
+DB_POINTER_PATH = "data.current"  # names the db file readers should use
+DB_READERS_PATH = "{}.readers"  # share-locked by every process still reading the db it is named after
+DB_SHADOW_GLOB = "data.*.sqlite3"
+DB_SHADOW_PATH = "data.{}.sqlite3"  # an update writes to a new db named after its start time
 DINING_HALL = "dining_hall"
 EATERY_DATA_PATH = "./eatery-data/"
+FETCH_CACHE_PATH = "./fetch-cache/"  # bodies and validators of upstream json, reused by conditional requests
+FETCH_CHUNK_SIZE = 64 * 1024  # bytes of a response written, or characters of a body parsed, at a time when streaming
+FETCH_CONNECT_TIMEOUT = 5  # seconds
+FETCH_RETRIES = 3  # retries of a request whose connection failed or whose server errored
+FETCH_RETRY_BACKOFF = 0.5  # backoff factor of the delays between retries, which double every retry
+FETCH_THREADS = 8  # upstream sources fetched at once
+FETCH_TIMEOUT = 30  # seconds to wait for a response once connected
+FETCH_TTL_SPREAD = 86400  # seconds over which the expiries of entries cached with a ttl are randomly spread
 GET_LOCATIONS = {
     "Attrium Cafe": "Atrium Café",
     "Bear Necessities Grill & C-Store": "Bear Necessities",
@@ -25,9 +40,13 @@ GET_URL = "https://services.get.cbord.com/GETServices/services/json"
 GIT_CONTENT_URL = "https://raw.githubusercontent.com/cuappdev"
 IGNORE_LOCATIONS = ["BS-No Bill Workstation", "Admin Workstation (B)", "GET Location"]
 IMAGES_URL = GIT_CONTENT_URL + "/assets/master/eatery/eatery-images/"
+INGEST_VERSION = 2  # part of every stored eatery hash; bump it when parsing changes so every eatery is rewritten
+TIME_DEPENDENT_CACHE_PERIOD = 60  # seconds a cached response that depends on the current time stays valid
+TIME_DEPENDENT_FIELDS = ["closesAt", "isOpen", "nextOpen", "openNow"]
 TRILLIUM = "trillium"
 TRILLIUM_ID = 23
 TRILLIUM_SLUG = "Trillium"
+LOADER_MAX_DATE_RANGES = 16  # date ranges of operating hours kept per loader until the full hours are loaded
 LOCATION_NAMES = {
     "Alice Cook House": {"name": "Cook House Dining Room", "type": DINING_HALL},
     "Bear Necessities": {"name": "Bear Necessities Grill & C-Store", "type": BRB_ONLY},
@@ -60,7 +79,6 @@ LOCATION_NAMES = {
     "Straight Market": {"name": "Straight from the Market", "type": BRB_ONLY},
     "Trillium": {"name": "Trillium", "type": TRILLIUM},
 }
-NUM_DAYS_STORED_IN_DB = 8
 PAY_METHODS = {
     "brbs": "Meal Plan - Debit",
     "c-card": "Cornell Card",
@@ -69,6 +87,20 @@ PAY_METHODS = {
     "swipes": "Meal Plan - Swipe",
 }
 POSITIVE_TRANSACTION_TYPE = 3
+REFRESH_INTERVALS = {  # seconds between runs of each scheduler job
+    "collegetown": 3600,
+    "cornell_dining": 3600,
+    "expanded_items": 86400,
+    "static_eateries": 86400,
+    "swipe_data": 3600,
+}
+RECORDING_VERSION = 1  # format of recorded upstream responses; bump it when the format changes
+RECORDINGS_PATH = "./recordings/"  # each recorded update is kept in its own directory here
+RESPONSE_CACHE_SIZE = 64  # maximum number of GraphQL responses cached per process
+SCHEDULER_JITTER = 0.1  # fraction of its delay each scheduled run is randomly postponed by
+SCHEDULER_RETRY_DELAY = 60  # seconds before retrying a failed job, doubled after every consecutive failure
+SCHEDULE_DAYS = 8  # days of hours expanded from weekly schedules when a query gives no end date
+SCHEDULE_MAX_DAYS = 366  # most days of hours expanded from weekly schedules for a single query
 SCHOOL_BREAKS = {
     "fall": "10/12/19-10/15/19",
     "thanksgiving": "11/27/19-12/01/19",
@@ -79,7 +111,12 @@ SCHOOL_BREAKS = {
     "finals_spring": "5/6/20-5/16/20",
     "summer": "5/17/20-8/27/20",
 }
+SNAPSHOT_CHECK_INTERVAL = 10  # seconds between checks for a new data generation
+SQLITE_CACHE_SIZE = -64000  # negative sizes are in KiB, so 64MB of page cache per connection
 SQLITE_MAX_VARIABLE_NUMBER = 999
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # bytes of the db file each connection memory-maps
+SQLITE_SYNCHRONOUS = "NORMAL"  # safe with WAL, and skips an fsync on every commit
+STATIC_SOURCES_PATH = "./static_sources/"  # local copies of the static sources, read instead of STATIC_SOURCES_URL
 STATIC_SOURCES_URL = GIT_CONTENT_URL + "/eatery-backend/master/static_sources/"
 STATIC_CTOWN_HOURS_URL = STATIC_SOURCES_URL + "externalHours.json"
 STATIC_EATERIES_URL = STATIC_SOURCES_URL + "externalEateries.json"
@@ -99,6 +136,7 @@ STATIC_ATTRIBUTES_URL = STATIC_SOURCES_URL + "attributes.json"
 SWIPE_DENSITY_ROUND = 3
 SWIPE_PLANS = ["Bear Basic", "Bear Choice", "Bear Traditional", "Flex 10/500", "Off", "Unlimited"]
 TABLE_COLUMNS = ["date", "session_type", "weekday", "location", "start_time", "end_time", "swipes", "multiplier"]
+UNCACHED_FIELDS = ["accountInfo"]  # per-user fields whose responses are never cached
 UPDATE_DELAY = 86400  # 24 hours in seconds
 UPDATE_DELAY_TESTING = 60  # 1 minute in seconds
 # default multiplier for converting average swipes/count to wait time
@@ -107,8 +145,12 @@ WEEKDAYS = {"monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday":
 YELP_LATITUDE = 42.440680
 YELP_LONGITUDE = -76.486043
 YELP_RADIUS = 200  # meters
+YELP_BUSINESS_TTL = 3 * 86400  # seconds the details of a restaurant are cached for
+YELP_MAX_RESULTS = 1000  # yelp serves no search results past this offset
+YELP_QUERIES_PER_SECOND = 5  # yelp's per-second query limit
+YELP_QUERY_THREADS = 4  # detail queries in flight at once
 YELP_RESTAURANT_LIMIT = 50  # maximum restaurants returned per query (as allowed by yelp)
-YELP_QUERY_DELAY = 0.8  # seconds
+YELP_SEARCH_TTL = 86400  # seconds the search results are cached for
 
 
 def get_today():
@@ -1,9 +1,10 @@
-from sqlalchemy import Boolean, Column, Float, Integer, String
+from sqlalchemy import Boolean, Column, Float, Index, Integer, String
 from .config import Base
 
 
 class CampusEatery(Base):
     __tablename__ = "campusEateries"
+    __table_args__ = (Index("ix_campusEateries_slug", "slug"),)
     id = Column(Integer, nullable=False, primary_key=True)
     about = Column(String, nullable=False)
     campus_area_desc = Column(String, nullable=False)
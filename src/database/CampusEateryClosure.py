@@ -0,0 +1,14 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
+from sqlalchemy.ext.declarative import declared_attr
+from .config import Base
+
+
+class CampusEateryClosure(Base):
+    @declared_attr
+    def eatery_id(cls):
+        return Column(Integer, ForeignKey("campusEateries.id"), nullable=False)
+
+    __table_args__ = (Index("ix_campusEateryClosures_eatery_id", "eatery_id"),)
+    id = Column(Integer, nullable=False, primary_key=True)
+    end_date = Column(String, nullable=False)  # inclusive ISO date
+    start_date = Column(String, nullable=False)
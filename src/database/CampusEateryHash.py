@@ -0,0 +1,16 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
+from sqlalchemy.ext.declarative import declared_attr
+from .config import Base
+
+
+class CampusEateryHash(Base):
+    @declared_attr
+    def eatery_id(cls):
+        return Column(Integer, ForeignKey("campusEateries.id"), nullable=False)
+
+    __tablename__ = "campusEateryHashes"
+    __table_args__ = (Index("ix_campusEateryHashes_eatery_id", "eatery_id"),)
+    id = Column(Integer, nullable=False, primary_key=True)
+    metadata_hash = Column(String, nullable=False)  # sha1 of the eatery's own columns
+    hours_hash = Column(String, nullable=False)  # sha1 of the upstream hours and menus
+    expanded_menu_hash = Column(String, nullable=False)  # sha1 of the upstream expanded menu
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.declarative import declared_attr
 from .config import Base
 
@@ -8,9 +8,15 @@ class CampusEateryHour(Base):
     def eatery_id(cls):
         return Column(Integer, ForeignKey("campusEateries.id"), nullable=False)
 
+    __table_args__ = (
+        Index("ix_campusEateryHours_eatery_id_date", "eatery_id", "date"),
+        Index("ix_campusEateryHours_start_timestamp_end_timestamp", "start_timestamp", "end_timestamp"),
+    )
     id = Column(Integer, nullable=False, primary_key=True)
     date = Column(String, nullable=False)
     event_description = Column(String, nullable=True)
     event_summary = Column(String, nullable=True)
     end_time = Column(String, nullable=True)
     start_time = Column(String, nullable=True)
+    end_timestamp = Column(Integer, nullable=True)  # epoch seconds of end_time
+    start_timestamp = Column(Integer, nullable=True)  # epoch seconds of start_time
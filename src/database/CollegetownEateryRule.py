@@ -0,0 +1,17 @@
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String
+from sqlalchemy.ext.declarative import declared_attr
+from .config import Base
+
+
+class CollegetownEateryRule(Base):
+    @declared_attr
+    def eatery_id(cls):
+        return Column(Integer, ForeignKey("collegetownEateries.id"), nullable=False)
+
+    __table_args__ = (Index("ix_collegetownEateryRules_eatery_id", "eatery_id"),)
+    id = Column(Integer, nullable=False, primary_key=True)
+    weekday = Column(Integer, nullable=False)  # 0 is Monday, as in date.weekday()
+    event_description = Column(String, nullable=True)
+    end_time = Column(String, nullable=True)  # e.g. 03:00PM, null for a weekday without events
+    start_time = Column(String, nullable=True)
+    overnight = Column(Boolean, nullable=False, default=False)  # whether end_time is on the next day
@@ -0,0 +1,7 @@
+from sqlalchemy import Column, Integer, String
+from .config import Base
+
+
+class DataVersion(Base):
+    id = Column(Integer, nullable=False, primary_key=True)  # the data generation, bumped after every update
+    updated_at = Column(String, nullable=False)
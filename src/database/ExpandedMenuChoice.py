@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.declarative import declared_attr
 from .config import Base
 
@@ -8,6 +8,7 @@ class ExpandedMenuChoice(Base):
     def menu_item_id(cls):
         return Column(Integer, ForeignKey("expandedMenuItems.id"), nullable=False)
 
+    __table_args__ = (Index("ix_expandedMenuChoices_menu_item_id", "menu_item_id"),)
     id = Column(Integer, nullable=False, primary_key=True)
     label = Column(String, nullable=True)
     options = Column(String, nullable=True)
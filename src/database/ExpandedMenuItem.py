@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.declarative import declared_attr
 from .config import Base
 
@@ -8,6 +8,7 @@ class ExpandedMenuItem(Base):
     def station_category_id(cls):
         return Column(Integer, ForeignKey("expandedMenuStations.id"), nullable=False)
 
+    __table_args__ = (Index("ix_expandedMenuItems_station_category_id", "station_category_id"),)
     id = Column(Integer, nullable=False, primary_key=True)
     healthy = Column(Boolean, nullable=False)
     item = Column(String, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.declarative import declared_attr
 from .config import Base
 
@@ -8,5 +8,6 @@ class ExpandedMenuStation(Base):
     def campus_eatery_id(cls):
         return Column(Integer, ForeignKey("campusEateries.id"), nullable=False)
 
+    __table_args__ = (Index("ix_expandedMenuStations_campus_eatery_id", "campus_eatery_id"),)
     id = Column(Integer, nullable=False, primary_key=True)
     station_category = Column(String, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.declarative import declared_attr
 from .config import Base
 
@@ -13,5 +13,9 @@ class MenuCategory(Base):
         return Column(Integer, ForeignKey("campusEateryHours.eatery_id"), nullable=False)
 
     __tablename__ = "menuCategories"
+    __table_args__ = (
+        Index("ix_menuCategories_event_id", "event_id"),
+        Index("ix_menuCategories_eatery_id_event_id", "eatery_id", "event_id"),
+    )
     id = Column(Integer, nullable=False, primary_key=True)
     category = Column(String, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.declarative import declared_attr
 from .config import Base
 
@@ -8,7 +8,9 @@ class SwipeData(Base):
     def eatery_id(cls):
         return Column(Integer, ForeignKey("campusEateries.id"), nullable=False)
 
+    __table_args__ = (Index("ix_swipeDatas_eatery_id", "eatery_id"),)
     id = Column(Integer, nullable=False, primary_key=True)
+    date = Column(String, nullable=False)  # the day the data was computed for, as YYYY-MM-DD
     end_time = Column(String, nullable=False)
     session_type = Column(String, nullable=False)
     start_time = Column(String, nullable=False)
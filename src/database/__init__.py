@@ -1,9 +1,13 @@
 # flake8: noqa
 
 from .CampusEatery import CampusEatery
+from .CampusEateryClosure import CampusEateryClosure
+from .CampusEateryHash import CampusEateryHash
 from .CampusEateryHour import CampusEateryHour
+from .CampusEateryRule import CampusEateryRule
 from .CollegetownEatery import CollegetownEatery
-from .CollegetownEateryHour import CollegetownEateryHour
+from .CollegetownEateryRule import CollegetownEateryRule
+from .DataVersion import DataVersion
 from .ExpandedMenuChoice import ExpandedMenuChoice
 from .ExpandedMenuItem import ExpandedMenuItem
 from .ExpandedMenuStation import ExpandedMenuStation
@@ -11,4 +15,12 @@ from .MenuCategory import MenuCategory
 from .MenuItem import MenuItem
 from .SwipeData import SwipeData
 
-from .config import Base, Session, Engine
+from .config import (
+    Base,
+    Session,
+    create_db_engine,
+    dispose_read_engines,
+    get_db_path,
+    get_read_engine,
+    release_read_engine,
+)
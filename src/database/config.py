@@ -1,10 +1,90 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.declarative import declared_attr
 
-Engine = create_engine("sqlite:///data.sqlite3", convert_unicode=True)
-Session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=Engine))
+from ..constants import DB_PATH, DB_POINTER_PATH, SQLITE_CACHE_SIZE, SQLITE_MMAP_SIZE, SQLITE_SYNCHRONOUS
+
+# updates bind the session to the engine of the db they write to
+Session = scoped_session(sessionmaker(autocommit=False, autoflush=False))
+_read_engines = {}
+
+
+def get_db_path():
+    """Returns the path of the db readers should use, as named by the pointer file that updates replace once their db
+    is complete, or DB_PATH before the first update is published.
+    """
+    try:
+        with open(DB_POINTER_PATH) as pointer:
+            return pointer.read().strip() or DB_PATH
+    except FileNotFoundError:
+        return DB_PATH
+
+
+def create_db_engine(path, read_only=False):
+    """Returns a new engine for the sqlite db at path. Connections of a read_only engine open the file in read-only
+    mode, so they can't write, and fail instead of creating the db if it doesn't exist.
+    """
+    if read_only:
+        engine = create_engine("sqlite:///file:{}?mode=ro&uri=true".format(path), convert_unicode=True)
+        event.listen(engine, "connect", set_query_only)
+    else:
+        engine = create_engine("sqlite:///" + path, convert_unicode=True)
+        event.listen(engine, "connect", set_wal_mode)
+    event.listen(engine, "connect", set_pragmas)
+    return engine
+
+
+def get_read_engine(path):
+    """Returns the read-only engine of the db at path, creating it on first use.
+
+    Creating an engine also releases the engines of dbs that were removed since, so a long running reader doesn't keep
+    one for every db ever published.
+    """
+    engine = _read_engines.get(path)
+    if engine is None:
+        for old_path in list(_read_engines):
+            if not os.path.exists(old_path):
+                release_read_engine(old_path)
+        engine = _read_engines.setdefault(path, create_db_engine(path, read_only=True))
+    return engine
+
+
+def release_read_engine(path):
+    """Disposes of the read-only engine of the db at path, if there is one, and forgets it."""
+    engine = _read_engines.pop(path, None)
+    if engine is not None:
+        engine.dispose()
+
+
+def dispose_read_engines():
+    """Drops the pooled connections of every read-only engine without closing them, for use after a fork."""
+    for engine in list(_read_engines.values()):
+        engine.dispose(close=False)
+
+
+def set_wal_mode(dbapi_connection, connection_record):
+    """Puts the db in WAL mode, so readers keep reading the last committed data while an update writes."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.close()
+
+
+def set_pragmas(dbapi_connection, connection_record):
+    """Tunes the page cache, memory map and syncing of every new connection."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous = {}".format(SQLITE_SYNCHRONOUS))
+    cursor.execute("PRAGMA cache_size = {}".format(SQLITE_CACHE_SIZE))
+    cursor.execute("PRAGMA mmap_size = {}".format(SQLITE_MMAP_SIZE))
+    cursor.close()
+
+
+def set_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
 
 
 class TableNameBase(object):
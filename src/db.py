@@ -1,15 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-import requests
+import fcntl
+from glob import glob
+import os
+import sqlite3
+from threading import Lock, local
+from weakref import WeakValueDictionary
+from sqlalchemy import func, inspect, select
+from sqlalchemy.exc import OperationalError
 
 from .collegetown import collegetown_search
-from .constants import CORNELL_DINING_URL, STATIC_EATERIES_URL, STATIC_EATERY_SLUGS, STATIC_EXPANDED_ITEMS_URL
+from .constants import (
+    CORNELL_DINING_URL,
+    DB_KEPT_FILES,
+    DB_LOCK_PATH,
+    DB_POINTER_PATH,
+    DB_READERS_PATH,
+    DB_SHADOW_GLOB,
+    DB_SHADOW_PATH,
+    EATERY_DATA_PATH,
+    STATIC_ATTRIBUTES_URL,
+    STATIC_CTOWN_HOURS_URL,
+    STATIC_EATERIES_URL,
+    STATIC_EATERY_SLUGS,
+    STATIC_EXPANDED_ITEMS_URL,
+    STATIC_MENUS_URL,
+    TRILLIUM_SLUG,
+    get_today,
+)
 from .database import (
     Base,
     CampusEatery,
+    CampusEateryClosure,
+    CampusEateryHash,
     CampusEateryHour,
+    CampusEateryRule,
     CollegetownEatery,
-    CollegetownEateryHour,
-    Engine,
+    CollegetownEateryRule,
+    DataVersion,
     ExpandedMenuChoice,
     ExpandedMenuItem,
     ExpandedMenuStation,
@@ -17,164 +46,706 @@ from .database import (
     MenuItem,
     Session,
     SwipeData,
+    create_db_engine,
+    get_db_path,
+    get_read_engine,
+    release_read_engine,
 )
 from .eatery_db import (
     export_data,
-    parse_campus_eateries,
+    get_trillium_menu,
+    hash_json,
+    index_by,
+    parse_campus_eatery,
     parse_campus_hours,
     parse_collegetown_eateries,
-    parse_collegetown_hours,
+    parse_collegetown_schedule,
     parse_expanded_menu,
     parse_expanded_items,
     parse_expanded_choices,
     parse_menu_categories,
     parse_menu_items,
     parse_static_eateries,
-    parse_static_op_hours,
+    parse_static_schedule,
     parse_to_csv,
 )
+from .fetch import (
+    fetch_all,
+    fetch_changed,
+    fetch_items,
+    fetch_json,
+    forget_changes,
+    start_fetch_run,
+    track_file,
+    track_json,
+)
+
+_thread_data = local()
+_db_references = WeakValueDictionary()
+_db_references_lock = Lock()
+
+CAMPUS_TABLES = [
+    CampusEatery.__table__,
+    CampusEateryClosure.__table__,
+    CampusEateryHash.__table__,
+    CampusEateryHour.__table__,
+    CampusEateryRule.__table__,
+    ExpandedMenuChoice.__table__,
+    ExpandedMenuItem.__table__,
+    ExpandedMenuStation.__table__,
+    MenuCategory.__table__,
+    MenuItem.__table__,
+    SwipeData.__table__,
+]
+COLLEGETOWN_TABLES = [CollegetownEatery.__table__, CollegetownEateryRule.__table__]
+
+
+def get_connection():
+    """Returns the read-only connection of the calling thread to the current db, opening it on first use.
+
+    sqlite connections can't be shared between threads or across a fork, so every thread of every worker process that
+    reads from the db gets its own. Once an update publishes a new db, the next call reopens the connection on it.
+    """
+    path = get_current_db_path()
+    conn = getattr(_thread_data, "conn", None)
+    if conn is None or _thread_data.pid != os.getpid() or _thread_data.path != path:
+        if conn is not None and _thread_data.pid == os.getpid():
+            conn.close()
+        conn = _thread_data.conn = get_read_engine(path).connect()
+        _thread_data.pid = os.getpid()
+        _thread_data.path = path
+    return conn
+
+
+def get_current_db_path():
+    """Returns the path of the db the calling thread reads from: the one it is pinned to, or the published one."""
+    return getattr(_thread_data, "pinned_path", None) or get_db_path()
+
+
+@contextmanager
+def pinned_db(path):
+    """Makes get_connection read from the db at path in the calling thread until the block exits, so data loaded in
+    parts stays consistent when an update is published in between.
+    """
+    previous = getattr(_thread_data, "pinned_path", None)
+    _thread_data.pinned_path = path
+    try:
+        yield
+    finally:
+        _thread_data.pinned_path = previous
+
+
+class DbReference(object):
+    """Holds a shared lock on the readers file of a db for as long as the reference is alive, so publish_db keeps the
+    db on disk while anything that may still lazily read from it exists.
+
+    Args:
+        path (str): the path of the db
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._readers_file = open(DB_READERS_PATH.format(path), "a")
+        fcntl.flock(self._readers_file, fcntl.LOCK_SH)
+
+    def __del__(self):
+        # closing the file releases the lock
+        self._readers_file.close()
+
+
+def reference_db(path):
+    """Returns the DbReference of this process to the db at path, creating it if no live one exists.
+
+    Keep the returned reference for as long as the db may be read from.
+    """
+    with _db_references_lock:
+        reference = _db_references.get(path)
+        if reference is None:
+            reference = _db_references[path] = DbReference(path)
+        return reference
+
+
+def create_shadow_db():
+    """Copies the current db into a new file for an update to write to, so readers keep using the current db, with no
+    partial data, until the update is published.
+
+    Returns the path of the new db.
+    """
+    path = DB_SHADOW_PATH.format(datetime.now().strftime("%Y%m%d%H%M%S%f"))
+    source = sqlite3.connect(get_db_path())
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return path
+
+
+def validate_db(engine):
+    """Raises an exception unless the db of engine passes sqlite's quick check and has campus eateries and hours."""
+    with engine.connect() as conn:
+        check = conn.exec_driver_sql("PRAGMA quick_check").scalar()
+        if check != "ok":
+            raise Exception("db failed quick check: {}".format(check))
+        for table in [CampusEatery.__table__, CampusEateryHour.__table__]:
+            if not conn.execute(select(func.count()).select_from(table)).scalar():
+                raise Exception("db has no {}".format(table.name))
+
+
+def publish_db(path):
+    """Points readers at the db at path by atomically replacing the pointer file, then removes all but the newest
+    DB_KEPT_FILES published dbs, except for those that a process still holds a DbReference to.
+    """
+    temp_pointer_path = DB_POINTER_PATH + ".tmp"
+    with open(temp_pointer_path, "w") as pointer:
+        pointer.write(path)
+    os.replace(temp_pointer_path, DB_POINTER_PATH)
+    for old_path in sorted(glob(DB_SHADOW_GLOB))[:-DB_KEPT_FILES]:
+        with open(DB_READERS_PATH.format(old_path), "a") as readers_file:
+            try:
+                fcntl.flock(readers_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # still referenced, so a later publish removes it
+                continue
+            remove_db(old_path)
+
 
-conn = Engine.connect()
+def remove_db(path):
+    """Deletes a db file along with its WAL, shared memory and readers files, and releases its read-only engine."""
+    release_read_engine(path)
+    for file_path in [path, path + "-wal", path + "-shm", DB_READERS_PATH.format(path)]:
+        if os.path.exists(file_path):
+            os.remove(file_path)
 
 
-def get_campus_eateries(data_json, refresh=False):
+def analyze_db(engine):
+    """Creates any index the tables of an existing db are missing, then refreshes sqlite's statistics so the query
+    planner picks those indexes for the read path.
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if inspector.has_table(table.name):
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute("ANALYZE")
+
+
+class BulkWriter(object):
+    """Collects the changes of an update and writes them all in one transaction.
+
+    Primary keys are assigned as rows are added, continuing from the largest id already in each table, so child rows
+    can reference their parents before anything is written. Queued deletes run first, children before parents, and
+    each table is then inserted with a single executemany.
+
+    Args:
+        engine (Engine): the engine of the db to write to
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._next_ids = {}
+        self._models = {}
+        self._deletes = {}
+
+    def add_all(self, models):
+        """Assigns ids to models that don't have one yet and queues them for writing."""
+        for model in models:
+            table = model.__table__
+            if model.id is None:
+                model.id = self._next_id(table)
+            self._models.setdefault(table, []).append(model)
+
+    def delete(self, table, criterion):
+        """Queues the deletion of the rows of table matching criterion."""
+        self._deletes.setdefault(table, []).append(criterion)
+
+    def _next_id(self, table):
+        if table not in self._next_ids:
+            with self.engine.connect() as conn:
+                self._next_ids[table] = (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+        next_id = self._next_ids[table]
+        self._next_ids[table] += 1
+        return next_id
+
+    def has_changes(self):
+        return bool(self._models or self._deletes)
+
+    def row_count(self):
+        return sum(len(models) for models in self._models.values())
+
+    def write(self):
+        """Runs every queued delete, children before parents, then inserts every queued row, parents before
+        children.
+        """
+        with self.engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                for criterion in self._deletes.get(table, []):
+                    conn.execute(table.delete().where(criterion))
+            for table in Base.metadata.sorted_tables:
+                if self._models.get(table):
+                    columns = table.columns.keys()
+                    rows = [{column: getattr(model, column) for column in columns} for model in self._models[table]]
+                    conn.execute(table.insert(), rows)
+        self._models = {}
+        self._deletes = {}
+
+
+def get_campus_eateries(static_json, engine, writer, refresh=False):
+    """Diffs the campus eateries in the db against their upstream data.
+
+    Each eatery's metadata, hours and menus, and expanded menu are hashed and compared with the hashes stored by the
+    last update. Eateries are matched by slug; the rows of changed fragments are queued for deletion, eateries whose
+    metadata changed or that are new are queued for writing, and eateries no longer listed upstream are deleted with
+    all of their rows, so unchanged rows keep their ids. Without refresh, the eatery rows in the db are kept as they
+    are and only their hours and menus are diffed. The Cornell Dining json is read one eatery at a time.
+
+    Returns 1) a list of every campus eatery, with ids assigned 2) a dict mapping "hours" and "expanded_menu" to the
+    set of ids of the eateries whose rows for that fragment need to be written.
+
+    Args:
+        static_json (dict): a valid dictionary from the static eateries json
+        engine (Engine): the engine of the db being updated
+        writer (BulkWriter): the writer to queue changes to
+        refresh (bool): whether to parse the eateries themselves again
+    """
+    if refresh and has_outdated_tables(engine, CAMPUS_TABLES):
+        # rows can only be kept while their tables match the models, so outdated tables are rebuilt from scratch
+        Base.metadata.drop_all(bind=engine, tables=CAMPUS_TABLES)
+    Base.metadata.create_all(bind=engine, tables=CAMPUS_TABLES)
+    stored_eateries = {eatery.slug: eatery for eatery in CampusEatery.query.all()}
+    stored_hashes = {eatery_hash.eatery_id: eatery_hash for eatery_hash in CampusEateryHash.query.all()}
+
+    static_by_slug = index_by(static_json["eateries"], "slug")
+    menus_by_slug = index_by(fetch_json(STATIC_EXPANDED_ITEMS_URL)["eateries"], "slug")
+
     if refresh:
-        Base.metadata.drop_all(
-            bind=Engine,
-            tables=[
-                CampusEatery.__table__,
-                CampusEateryHour.__table__,
-                ExpandedMenuChoice.__table__,
-                ExpandedMenuItem.__table__,
-                ExpandedMenuStation.__table__,
-                MenuCategory.__table__,
-                MenuItem.__table__,
-                SwipeData.__table__,
-            ],
-        )
-        Base.metadata.create_all(
-            bind=Engine,
-            tables=[
-                CampusEatery.__table__,
-                CampusEateryHour.__table__,
-                ExpandedMenuChoice.__table__,
-                ExpandedMenuItem.__table__,
-                ExpandedMenuStation.__table__,
-                MenuCategory.__table__,
-                MenuItem.__table__,
-                SwipeData.__table__,
-            ],
-        )
         print("[{}] Updating campus eateries".format(datetime.now()))
-        campus_eateries = parse_campus_eateries(data_json)
-        Session.add_all(campus_eateries)
-        Session.commit()
+    campus_eateries = []
+    hours_hashes = {}
+    for eatery_json in iter_campus_json():
+        hours_hashes.setdefault(eatery_json.get("slug", ""), hash_campus_hours(eatery_json))
+        if refresh:
+            campus_eateries.append(parse_campus_eatery(eatery_json))
+    if refresh:
+        campus_eateries += parse_static_eateries(static_json)
+    else:
+        campus_eateries = list(stored_eateries.values())
+
+    changed = {"metadata": set(), "hours": set(), "expanded_menu": set()}
+    for eatery in campus_eateries:
+        stored = stored_eateries.pop(eatery.slug, None)
+        if stored is not None:
+            eatery.id = stored.id
+        else:
+            writer.add_all([eatery])
+
+        new_hash = hash_campus_eatery(eatery, hours_hashes, static_by_slug, menus_by_slug)
+        old_hash = stored_hashes.get(eatery.id) if stored is not None else None
+        for fragment in changed:
+            column = fragment + "_hash"
+            if old_hash is None or getattr(old_hash, column) != getattr(new_hash, column):
+                changed[fragment].add(eatery.id)
+                if stored is not None and fragment == "metadata":
+                    writer.add_all([eatery])
+        if old_hash is None or any(eatery.id in ids for ids in changed.values()):
+            writer.add_all([new_hash])
+
+    removed_ids = [eatery.id for eatery in stored_eateries.values()]
+    delete_campus_rows(writer, changed, removed_ids)
+    print(
+        "[{}] Campus eateries changed: {} metadata, {} hours, {} expanded menus, {} removed".format(
+            datetime.now(),
+            len(changed["metadata"]),
+            len(changed["hours"]),
+            len(changed["expanded_menu"]),
+            len(removed_ids),
+        )
+    )
+    return campus_eateries, changed
+
+
+def get_schema(engine):
+    """Returns a dict mapping the name of each table in the db of engine to the set of its column names."""
+    inspector = inspect(engine)
+    return {table: {column["name"] for column in inspector.get_columns(table)} for table in inspector.get_table_names()}
+
+
+def has_outdated_tables(engine, tables):
+    """Returns True if any of tables exists in the db of engine with columns other than those of its model."""
+    inspector = inspect(engine)
+    for table in tables:
+        if inspector.has_table(table.name):
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            if columns != set(table.columns.keys()):
+                return True
+    return False
+
+
+def iter_campus_json():
+    """Yields the entry of each eatery in the Cornell Dining json, one at a time, so that the payload is never held
+    in memory whole.
+    """
+    return fetch_items(CORNELL_DINING_URL, ["data", "eateries"])
+
+
+def hash_campus_hours(eatery_json):
+    """Returns a hash of the fragments of an eatery's entry in the Cornell Dining json its hours and menus are parsed
+    from.
+    """
+    trillium_menu = get_trillium_menu() if eatery_json.get("slug") == TRILLIUM_SLUG else None
+    return hash_json(eatery_json.get("operatingHours"), eatery_json.get("diningItems"), trillium_menu)
+
+
+def hash_campus_eatery(eatery, hours_hashes, static_by_slug, menus_by_slug):
+    """Hashes the fragments of upstream data each part of a campus eatery's rows is parsed from.
+
+    Returns a new CampusEateryHash for the eatery.
+
+    Args:
+        eatery (CampusEatery): the eatery to hash
+        hours_hashes (dict): maps the slug of each eatery in the Cornell Dining json to its hash_campus_hours
+        static_by_slug (dict): maps slugs to the entries of the static eateries json
+        menus_by_slug (dict): maps slugs to the entries of the expanded items json
+    """
+    columns = [column for column in CampusEatery.__table__.columns.keys() if column != "id"]
+    if eatery.slug in STATIC_EATERY_SLUGS:
+        hours_hash = hash_json(static_by_slug.get(eatery.slug))
+        menu = None
     else:
-        campus_eateries = CampusEatery.query.all()
+        hours_hash = hours_hashes.get(eatery.slug) or hash_campus_hours({"slug": eatery.slug})
+        menu = menus_by_slug.get(eatery.slug)
+    return CampusEateryHash(
+        eatery_id=eatery.id,
+        metadata_hash=hash_json({column: getattr(eatery, column) for column in columns}),
+        hours_hash=hours_hash,
+        expanded_menu_hash=hash_json(menu),
+    )
+
+
+def delete_campus_rows(writer, changed, removed_ids):
+    """Queues the deletion of the rows of changed eatery fragments, and of every row of removed eateries.
+
+    Args:
+        writer (BulkWriter): the writer to queue deletes to
+        changed (dict): maps each fragment to the set of ids of the eateries whose rows for it are rewritten
+        removed_ids (list): ids of the eateries no longer listed upstream
+    """
+    hours_ids = list(changed["hours"]) + removed_ids
+    if hours_ids:
+        category_ids = select(MenuCategory.id).where(MenuCategory.eatery_id.in_(hours_ids))
+        writer.delete(MenuItem.__table__, MenuItem.category_id.in_(category_ids))
+        writer.delete(MenuCategory.__table__, MenuCategory.eatery_id.in_(hours_ids))
+        writer.delete(CampusEateryHour.__table__, CampusEateryHour.eatery_id.in_(hours_ids))
+        writer.delete(CampusEateryRule.__table__, CampusEateryRule.eatery_id.in_(hours_ids))
+        writer.delete(CampusEateryClosure.__table__, CampusEateryClosure.eatery_id.in_(hours_ids))
+
+    menu_ids = list(changed["expanded_menu"]) + removed_ids
+    if menu_ids:
+        station_ids = select(ExpandedMenuStation.id).where(ExpandedMenuStation.campus_eatery_id.in_(menu_ids))
+        item_ids = select(ExpandedMenuItem.id).where(ExpandedMenuItem.station_category_id.in_(station_ids))
+        writer.delete(ExpandedMenuChoice.__table__, ExpandedMenuChoice.menu_item_id.in_(item_ids))
+        writer.delete(ExpandedMenuItem.__table__, ExpandedMenuItem.station_category_id.in_(station_ids))
+        writer.delete(ExpandedMenuStation.__table__, ExpandedMenuStation.campus_eatery_id.in_(menu_ids))
+
+    hash_ids = list(set.union(*changed.values())) + removed_ids
+    if hash_ids:
+        writer.delete(CampusEateryHash.__table__, CampusEateryHash.eatery_id.in_(hash_ids))
+    metadata_ids = list(changed["metadata"]) + removed_ids
+    if metadata_ids:
+        writer.delete(CampusEatery.__table__, CampusEatery.id.in_(metadata_ids))
+    if removed_ids:
+        writer.delete(SwipeData.__table__, SwipeData.eatery_id.in_(removed_ids))
+
+
+def get_collegetown_eateries(yelp_query, static_ctown_json, engine, writer):
+    """Diffs the Collegetown eateries and their schedules in the db against their upstream data.
+
+    Eateries are matched by Yelp url and only written when one of their columns changed, so unchanged eateries keep
+    their ids. Each eatery's weekly hours are compiled into rules, which are only rewritten once they change. Eateries
+    no longer listed upstream are deleted with their rules.
+
+    Returns a list of every Collegetown eatery, with ids assigned.
+
+    Args:
+        yelp_query (list): the Yelp details of each eatery, as returned by collegetown_search
+        static_ctown_json (dict): a valid dictionary from the static Collegetown hours json
+        engine (Engine): the engine of the db being updated
+        writer (BulkWriter): the writer to queue changes to
+    """
+    with engine.begin() as conn:
+        # hours used to be stored for each date, and are now expanded from the rules when queried
+        conn.exec_driver_sql("DROP TABLE IF EXISTS collegetownEateryHours")
+    if has_outdated_tables(engine, COLLEGETOWN_TABLES):
+        Base.metadata.drop_all(bind=engine, tables=COLLEGETOWN_TABLES)
+    Base.metadata.create_all(bind=engine, tables=COLLEGETOWN_TABLES)
+    stored_eateries = {eatery.url: eatery for eatery in CollegetownEatery.query.all()}
+    stored_rules = {}
+    for rule in CollegetownEateryRule.query.order_by(CollegetownEateryRule.id):
+        stored_rules.setdefault(rule.eatery_id, []).append(get_row_values(rule))
+
+    yelp_by_url = index_by(yelp_query, "url")
+    static_by_alias = index_by(static_ctown_json["eateries"], "alias")
+    collegetown_eateries = parse_collegetown_eateries(yelp_query)
+    changed_ids = []
+    rules_changed_ids = []
+    for eatery in collegetown_eateries:
+        stored = stored_eateries.pop(eatery.url, None)
+        if stored is not None:
+            eatery.id = stored.id
+        if stored is None or get_row_values(stored) != get_row_values(eatery):
+            if stored is not None:
+                changed_ids.append(eatery.id)
+            writer.add_all([eatery])
+
+        eatery_json = yelp_by_url.get(eatery.url)
+        static_eatery = static_by_alias.get(eatery_json.get("alias", "")) if eatery_json else None
+        rules = parse_collegetown_schedule(eatery_json, eatery, static_eatery)
+        old_rules = stored_rules.get(eatery.id, []) if stored is not None else []
+        if old_rules != [get_row_values(rule) for rule in rules]:
+            if old_rules:
+                rules_changed_ids.append(eatery.id)
+            writer.add_all(rules)
+
+    removed_ids = [eatery.id for eatery in stored_eateries.values()]
+    if rules_changed_ids or removed_ids:
+        writer.delete(
+            CollegetownEateryRule.__table__, CollegetownEateryRule.eatery_id.in_(rules_changed_ids + removed_ids)
+        )
+    if changed_ids or removed_ids:
+        writer.delete(CollegetownEatery.__table__, CollegetownEatery.id.in_(changed_ids + removed_ids))
+    return collegetown_eateries
+
+
+def get_row_values(model):
+    """Returns a tuple of the column values of model other than its id, to compare parsed rows with stored ones."""
+    return tuple(getattr(model, column) for column in model.__table__.columns.keys() if column != "id")
+
+
+def fetch_sources(recalculate_swipe=False, refresh_collegetown=False):
+    """Fetches every source of an update, all at the same time, so that later fetch_json calls of the update reuse
+    what was fetched here.
+
+    Returns the Yelp details of each Collegetown eatery, as returned by collegetown_search, or None if Collegetown
+    isn't refreshed. They are passed on to the update, so the eateries it writes are the ones whose changes were
+    tracked.
+    """
+    swipe_log_path = "{}{}".format(EATERY_DATA_PATH, "data.log")
+    if recalculate_swipe and os.path.exists(swipe_log_path):
+        track_file(swipe_log_path)
+    urls = [CORNELL_DINING_URL, STATIC_ATTRIBUTES_URL, STATIC_EATERIES_URL, STATIC_EXPANDED_ITEMS_URL, STATIC_MENUS_URL]
+    if refresh_collegetown:
+        urls.append(STATIC_CTOWN_HOURS_URL)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        yelp_eateries = executor.submit(collegetown_search) if refresh_collegetown else None
+        fetch_all(urls)
+        if yelp_eateries is None:
+            return None
+        yelp_query = yelp_eateries.result()
+    track_json("yelp:eateries", yelp_query)
+    return yelp_query
+
 
-    return campus_eateries
+def is_update_needed(recalculate_swipe=False, refresh_collegetown=False):
+    """Returns False if none of the sources fetched by fetch_sources, nor the swipe log when swipe data is
+    recalculated, changed since they were last fetched, and the db has been updated before and has every table the
+    update builds. When swipe data is recalculated, it must also have been computed today, as it is only stored for
+    the current day. Returns True otherwise.
+    """
+    if fetch_changed():
+        return True
 
+    try:
+        updated_at = (
+            get_connection().execute(select(DataVersion.updated_at).order_by(DataVersion.id.desc()).limit(1)).scalar()
+        )
+    except OperationalError:
+        return True
+    if updated_at is None:
+        return True
+    tables = CAMPUS_TABLES + (COLLEGETOWN_TABLES if refresh_collegetown else [])
+    if not all(inspect(get_connection()).has_table(table.name) for table in tables):
+        return True
+    if not recalculate_swipe:
+        return False
+    try:
+        swipe_date = get_connection().execute(select(func.max(SwipeData.date))).scalar()
+    except OperationalError:
+        return True
+    return swipe_date != get_today().isoformat()
+
+
+def start_update(refresh_campus=False, recalculate_swipe=False, refresh_collegetown=False, sources=None):
+    """Builds a new db from the current one and upstream data, and publishes it.
+
+    Updates run one at a time across processes, so each one starts from the db published by the last.
+
+    Returns False if the update failed, and True if it was published, discarded or skipped.
+
+    Args:
+        refresh_campus (bool): whether to parse the campus eateries themselves again
+        recalculate_swipe (bool): whether to recompute swipe data from the swipe log
+        refresh_collegetown (bool): whether to fetch Collegetown eateries from Yelp again
+        sources (list): the upstream urls to request again; others reuse the bodies kept by earlier updates. Every
+            url is requested again if sources is None.
+    """
+    with update_lock():
+        return run_update(refresh_campus, recalculate_swipe, refresh_collegetown, sources)
+
+
+@contextmanager
+def update_lock():
+    """Holds an exclusive lock on DB_LOCK_PATH until the block exits."""
+    with open(DB_LOCK_PATH, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_update(refresh_campus, recalculate_swipe, refresh_collegetown, sources):
+    start_fetch_run(sources)
+    try:
+        yelp_query = fetch_sources(recalculate_swipe, refresh_collegetown)
+    except Exception as e:
+        # the update fetches what is missing again, and fails if it still can't
+        print("Fetching sources failed:", e)
+        yelp_query = None
+    else:
+        if not is_update_needed(recalculate_swipe, refresh_collegetown):
+            print("[{}] Sources unchanged since the last update, skipping it".format(datetime.now()))
+            return True
 
-def start_update(refresh_campus=False, recalculate_swipe=False, refresh_collegetown=False):
+    path = create_shadow_db()
+    engine = create_db_engine(path)
+    Session.remove()
+    Session.configure(bind=engine)
+    writer = BulkWriter(engine)
+    schema = get_schema(engine)
     try:
         print("[{}] Fetching campus eateries".format(datetime.now()))
-        campus_json = requests.get(CORNELL_DINING_URL).json()
-        campus_eateries = get_campus_eateries(campus_json, refresh=refresh_campus)
+        static_json = fetch_json(STATIC_EATERIES_URL)
+        campus_eateries, changed = get_campus_eateries(static_json, engine, writer, refresh=refresh_campus)
 
         print("[{}] Updating campus eatery hours and menus".format(datetime.now()))
+        menus_by_slug = index_by(fetch_json(STATIC_EXPANDED_ITEMS_URL)["eateries"], "slug")
         for eatery in campus_eateries:
+            if eatery.slug in STATIC_EATERY_SLUGS:
+                continue
+
             # get the expanded menu if it exists
-            menus = requests.get(STATIC_EXPANDED_ITEMS_URL).json()
-            station_and_items = parse_expanded_menu(menus, eatery)
-            eatery_categories = (x[0] for x in station_and_items)
-            Session.add_all(eatery_categories)
-            Session.commit()
-
-            for station, item_json in station_and_items:
-                items_and_choices = parse_expanded_items(item_json, station)
-                items = (x[0] for x in items_and_choices)
-                Session.add_all(items)
-                Session.commit()
-
-                for item, choices_json in items_and_choices:
-                    choices = parse_expanded_choices(choices_json, item)
-                    Session.add_all(choices)
-                    Session.commit()
-
-            # if this is not a refresh, then static eateries are part of campus_eateries
-            if eatery.slug not in STATIC_EATERY_SLUGS:
-                hours_and_menus, dining_items = parse_campus_hours(campus_json, eatery)
-                eatery_hours = (x[0] for x in hours_and_menus)
-                Session.add_all(eatery_hours)
-                Session.commit()
+            if eatery.id in changed["expanded_menu"]:
+                station_and_items = parse_expanded_menu(menus_by_slug.get(eatery.slug), eatery)
+                eatery_categories = (x[0] for x in station_and_items)
+                writer.add_all(eatery_categories)
 
-                if dining_items:
-                    hours_and_menus.append((None, dining_items))
+                for station, item_json in station_and_items:
+                    items_and_choices = parse_expanded_items(item_json, station)
+                    items = (x[0] for x in items_and_choices)
+                    writer.add_all(items)
 
-                for eatery_hour, menu_json in hours_and_menus:
-                    categories_and_items = parse_menu_categories(menu_json, eatery_hour, eatery.id)
+                    for item, choices_json in items_and_choices:
+                        choices = parse_expanded_choices(choices_json, item)
+                        writer.add_all(choices)
 
-                    eatery_categories = (x[0] for x in categories_and_items)
-                    Session.add_all(eatery_categories)
-                    Session.commit()
+        # hours are parsed from each eatery's entry as it is read, and only for the eateries whose entry changed
+        hours_eateries = {
+            eatery.slug: eatery
+            for eatery in campus_eateries
+            if eatery.slug not in STATIC_EATERY_SLUGS and eatery.id in changed["hours"]
+        }
+        for eatery_json in iter_campus_json():
+            eatery = hours_eateries.pop(eatery_json.get("slug", ""), None)
+            if eatery is None:
+                continue
 
-                    for menu_category, items_json in categories_and_items:
-                        menu_items = parse_menu_items(items_json, menu_category)
-                        Session.add_all(menu_items)
-                        Session.commit()
+            hours_and_menus, dining_items = parse_campus_hours(eatery_json, eatery)
+            eatery_hours = (x[0] for x in hours_and_menus)
+            writer.add_all(eatery_hours)
 
-        print("[{}] Fetching static campus eateries".format(datetime.now()))
-        static_json = requests.get(STATIC_EATERIES_URL).json()
-        static_eateries = campus_eateries
+            if dining_items:
+                hours_and_menus.append((None, dining_items))
 
-        if refresh_campus:
-            print("[{}] Updating static campus eateries".format(datetime.now()))
-            static_eateries = parse_static_eateries(static_json)
-            Session.add_all(static_eateries)
-            Session.commit()
+            for eatery_hour, menu_json in hours_and_menus:
+                categories_and_items = parse_menu_categories(menu_json, eatery_hour, eatery.id)
 
-        print("[{}] Updating static eatery hours and menus".format(datetime.now()))
-        for eatery in static_eateries:
-            if eatery.slug in STATIC_EATERY_SLUGS:
-                hours_and_menus = parse_static_op_hours(static_json, eatery)
-                eatery_hours = (x[0] for x in hours_and_menus)
-                Session.add_all(eatery_hours)
-                Session.commit()
-
-                for eatery_hour, menu_json in hours_and_menus:
-                    categories_and_items = parse_menu_categories(menu_json, eatery_hour, eatery.id)
-                    eatery_categories = (x[0] for x in categories_and_items)
-                    Session.add_all(eatery_categories)
-                    Session.commit()
-
-                    for menu_category, items_json in categories_and_items:
-                        menu_items = parse_menu_items(items_json, menu_category)
-                        Session.add_all(menu_items)
-                        Session.commit()
+                eatery_categories = (x[0] for x in categories_and_items)
+                writer.add_all(eatery_categories)
+
+                for menu_category, items_json in categories_and_items:
+                    menu_items = parse_menu_items(items_json, menu_category)
+                    writer.add_all(menu_items)
+
+        print("[{}] Updating static eatery schedules and menus".format(datetime.now()))
+        static_by_slug = index_by(static_json["eateries"], "slug")
+        for eatery in campus_eateries:
+            if eatery.slug in STATIC_EATERY_SLUGS and eatery.id in changed["hours"]:
+                static_eatery = static_by_slug.get(eatery.slug)
+                rules, closures = parse_static_schedule(static_eatery, eatery)
+                writer.add_all(rules)
+                writer.add_all(closures)
+
+                # dining items are served at every event, so they are stored once for the eatery
+                dining_items = static_eatery.get("diningItems") if static_eatery else None
+                if dining_items:
+                    for menu_category, items_json in parse_menu_categories(dining_items, None, eatery.id):
+                        writer.add_all([menu_category])
+                        writer.add_all(parse_menu_items(items_json, menu_category))
 
         if recalculate_swipe:
             print("[{}] Updating swipe data".format(datetime.now()))
             data_path = parse_to_csv(file_name="data.csv")
-            Base.metadata.drop_all(bind=Engine, tables=[SwipeData.__table__])
-            Base.metadata.create_all(bind=Engine, tables=[SwipeData.__table__])
-            all_swipe_data = export_data(data_path, campus_eateries + static_eateries)
-            Session.add_all(all_swipe_data)
-            Session.commit()
+            if has_outdated_tables(engine, [SwipeData.__table__]):
+                Base.metadata.drop_all(bind=engine, tables=[SwipeData.__table__])
+            Base.metadata.create_all(bind=engine, tables=[SwipeData.__table__])
+            # swipe data is only kept for the current day, so stored rows are replaced, or cleared on a day without any
+            with engine.connect() as conn:
+                if conn.execute(select(func.count()).select_from(SwipeData.__table__)).scalar():
+                    writer.delete(SwipeData.__table__, SwipeData.id.isnot(None))
+            all_swipe_data = export_data(data_path, campus_eateries)
+            writer.add_all(all_swipe_data)
 
         if refresh_collegetown:
-            Base.metadata.drop_all(bind=Engine, tables=[CollegetownEatery.__table__, CollegetownEateryHour.__table__])
-            Base.metadata.create_all(bind=Engine, tables=[CollegetownEatery.__table__, CollegetownEateryHour.__table__])
-            print("[{}] Fetching Collegetown eateries".format(datetime.now()))
-            yelp_query = collegetown_search()
-            collegetown_eateries = parse_collegetown_eateries(yelp_query)
-            Session.add_all(collegetown_eateries)
-            Session.commit()
+            if yelp_query is None:
+                print("[{}] Fetching Collegetown eateries".format(datetime.now()))
+                yelp_query = collegetown_search()
 
             print("[{}] Updating Collegetown eateries and hours".format(datetime.now()))
-            for eatery in collegetown_eateries:
-                hours = parse_collegetown_hours(yelp_query, eatery)
-                Session.add_all(hours)
-                Session.commit()
+            get_collegetown_eateries(yelp_query, fetch_json(STATIC_CTOWN_HOURS_URL), engine, writer)
+
+        # tables created, dropped or rebuilt by the update are published even if no row changed
+        if not writer.has_changes() and get_schema(engine) == schema:
+            print("[{}] No eatery or table changed, discarding {}".format(datetime.now(), path))
+            Session.remove()
+            engine.dispose()
+            remove_db(path)
+            return True
+
+        # readers rebuild their eatery snapshots once they see a new data generation
+        Base.metadata.create_all(bind=engine, tables=[DataVersion.__table__])
+        writer.add_all([DataVersion(updated_at=datetime.now().isoformat())])
+        Session.remove()
+
+        print("[{}] Writing {} rows".format(datetime.now(), writer.row_count()))
+        writer.write()
+
+        print("[{}] Analyzing db".format(datetime.now()))
+        analyze_db(engine)
+
+        validate_db(engine)
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        engine.dispose()
+        publish_db(path)
+        print("[{}] Published {}".format(datetime.now(), path))
+        return True
 
     except Exception as e:
         print("Data update failed:", e)
+        forget_changes()
+        Session.remove()
+        engine.dispose()
+        remove_db(path)
+        return False
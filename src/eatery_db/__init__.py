@@ -1,16 +1,17 @@
 # flake8: noqa
 
 from .campus_eatery import (
-    parse_campus_eateries,
+    get_trillium_menu,
+    parse_campus_eatery,
     parse_campus_hours,
     parse_menu_categories,
     parse_menu_items,
     parse_static_eateries,
-    parse_static_op_hours,
+    parse_static_schedule,
 )
 
-from .collegetown_eatery import parse_collegetown_eateries, parse_collegetown_hours
+from .collegetown_eatery import parse_collegetown_eateries, parse_collegetown_schedule
 
-from .common_eatery import parse_expanded_menu, parse_expanded_items, parse_expanded_choices
+from .common_eatery import hash_json, index_by, parse_expanded_menu, parse_expanded_items, parse_expanded_choices
 
 from .swipes import export_data, parse_to_csv
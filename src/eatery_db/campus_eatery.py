@@ -1,119 +1,169 @@
-from datetime import datetime, timedelta
-import requests
-
-from .common_eatery import format_time, get_image_url, parse_coordinates, string_to_date_range
+from datetime import datetime
+
+from .common_eatery import (
+    format_event_times,
+    format_time,
+    get_image_url,
+    get_timestamp,
+    parse_coordinates,
+    string_to_date_range,
+)
 from ..constants import (
-    NUM_DAYS_STORED_IN_DB,
     PAY_METHODS,
     STATIC_MENUS_URL,
     STATIC_ATTRIBUTES_URL,
     TRILLIUM_SLUG,
     WEEKDAYS,
-    get_today,
 )
-from ..database import CampusEatery, CampusEateryHour, MenuCategory, MenuItem
+from ..database import CampusEatery, CampusEateryClosure, CampusEateryHour, CampusEateryRule, MenuCategory, MenuItem
+from ..fetch import fetch_json
 
 
-def parse_campus_eateries(data_json):
-    """Parses a Cornell Dining json dictionary.
+def parse_campus_eatery(eatery):
+    """Parses an eatery of the Cornell Dining json.
 
-    Returns a list of CampusEatery objects containing on campus dining options.
+    Returns a CampusEatery object for the eatery.
 
     Args:
-        data_json (dict): a valid dictionary from the Cornell Dining json
+        eatery (dict): the eatery's entry in the Cornell Dining json
     """
-    campus_eateries = []
-    attributes_json = requests.get(STATIC_ATTRIBUTES_URL).json()
-
-    for eatery in data_json["data"]["eateries"]:
-        brbs, cash, cornell_card, credit, mobile, swipes = parse_payments(eatery["payMethods"])
-        phone = eatery.get("contactPhone", "N/A")
-        phone = phone if phone else "N/A"
-        latitude, longitude = parse_coordinates(eatery)
-        eatery_attributes = attributes_json.get(eatery.get("slug", ""), {})
-        eatery_exceptions = ";;".join(eatery_attributes.get("exceptions", []))
-        reserve_url = eatery_attributes.get("reserve_url")
-        is_get = eatery_attributes.get("is_get", False)
-
-        new_eatery = CampusEatery(
-            about=eatery.get("about", ""),
-            campus_area_desc=parse_campus_area(eatery),
-            eatery_type=parse_eatery_type(eatery),
-            image_url=get_image_url(eatery.get("slug", "")),
-            latitude=0 if latitude is None else latitude,
-            location=eatery.get("location", ""),
-            longitude=0 if longitude is None else longitude,
-            name=eatery.get("name", ""),
-            name_short=eatery.get("nameshort", ""),
-            payment_method_brbs=brbs,
-            payment_method_cash=cash,
-            payment_method_cornell_card=cornell_card,
-            payment_method_credit=credit,
-            payment_method_mobile=mobile,
-            payment_method_swipes=swipes,
-            phone=phone,
-            slug=eatery.get("slug", ""),
-            exceptions=eatery_exceptions,
-            reserve_url=reserve_url,
-            is_get=is_get,
-        )
-
-        campus_eateries.append(new_eatery)
-
-    return campus_eateries
-
-
-def parse_campus_hours(data_json, eatery_model):
+    attributes_json = fetch_json(STATIC_ATTRIBUTES_URL)
+
+    brbs, cash, cornell_card, credit, mobile, swipes = parse_payments(eatery["payMethods"])
+    phone = eatery.get("contactPhone", "N/A")
+    phone = phone if phone else "N/A"
+    latitude, longitude = parse_coordinates(eatery)
+    eatery_attributes = attributes_json.get(eatery.get("slug", ""), {})
+    eatery_exceptions = ";;".join(eatery_attributes.get("exceptions", []))
+    reserve_url = eatery_attributes.get("reserve_url")
+    is_get = eatery_attributes.get("is_get", False)
+
+    return CampusEatery(
+        about=eatery.get("about", ""),
+        campus_area_desc=parse_campus_area(eatery),
+        eatery_type=parse_eatery_type(eatery),
+        image_url=get_image_url(eatery.get("slug", "")),
+        latitude=0 if latitude is None else latitude,
+        location=eatery.get("location", ""),
+        longitude=0 if longitude is None else longitude,
+        name=eatery.get("name", ""),
+        name_short=eatery.get("nameshort", ""),
+        payment_method_brbs=brbs,
+        payment_method_cash=cash,
+        payment_method_cornell_card=cornell_card,
+        payment_method_credit=credit,
+        payment_method_mobile=mobile,
+        payment_method_swipes=swipes,
+        phone=phone,
+        slug=eatery.get("slug", ""),
+        exceptions=eatery_exceptions,
+        reserve_url=reserve_url,
+        is_get=is_get,
+    )
+
+
+def parse_campus_hours(eatery, eatery_model):
     """Parses a Cornell Dining json dictionary.
 
     Returns 1) a list of tuples of CampusEateryHour objects for a corresponding CampusEatery object and their unparsed
-    menu 2) an array of the items an eatery serves.
+    menu 2) an array of the items an eatery serves. Events are merged with merge_campus_hours.
 
     Args:
-        data_json (dict): a valid dictionary from the Cornell Dining json
+        eatery (dict): the eatery's entry in the Cornell Dining json, or None if it is not listed there
         eatery_model (CampusEatery): the CampusEatery object to which to link the hours.
     """
     eatery_hours_and_menus = []
     dining_items = []
 
-    for eatery in data_json["data"]["eateries"]:
-        eatery_slug = eatery.get("slug", "")
-
-        if eatery_model.slug == eatery_slug:
-            dining_items = get_trillium_menu() if eatery_slug == TRILLIUM_SLUG else parse_dining_items(eatery)
-            hours_list = eatery["operatingHours"]
+    if eatery is not None:
+        dining_items = get_trillium_menu() if eatery_model.slug == TRILLIUM_SLUG else parse_dining_items(eatery)
+        hours_list = eatery["operatingHours"]
 
-            for hours in hours_list:
-                new_date = hours.get("date", "")
-                hours_events = hours["events"]
+        for hours in hours_list:
+            new_date = hours.get("date", "")
+            hours_events = hours["events"]
 
-                if hours_events:
-                    for event in hours_events:
-                        start, end = format_time(event.get("start", ""), event.get("end", ""), new_date)
+            if hours_events:
+                for event in hours_events:
+                    start, end = format_time(event.get("start", ""), event.get("end", ""), new_date)
 
-                        eatery_hour = CampusEateryHour(
-                            eatery_id=eatery_model.id,
-                            date=new_date,
-                            event_description=event.get("descr", ""),
-                            event_summary=event.get("calSummary", ""),
-                            end_time=end,
-                            start_time=start,
-                        )
-
-                        eatery_hours_and_menus.append((eatery_hour, event.get("menu", [])))
-
-                else:
                     eatery_hour = CampusEateryHour(
                         eatery_id=eatery_model.id,
                         date=new_date,
-                        event_description=None,
-                        event_summary=None,
-                        end_time=None,
-                        start_time=None,
+                        event_description=event.get("descr", ""),
+                        event_summary=event.get("calSummary", ""),
+                        end_time=end,
+                        start_time=start,
+                        end_timestamp=get_timestamp(end),
+                        start_timestamp=get_timestamp(start),
                     )
-                    eatery_hours_and_menus.append((eatery_hour, []))
 
-    return eatery_hours_and_menus, dining_items
+                    eatery_hours_and_menus.append((eatery_hour, event.get("menu", [])))
+
+            else:
+                eatery_hour = CampusEateryHour(
+                    eatery_id=eatery_model.id,
+                    date=new_date,
+                    event_description=None,
+                    event_summary=None,
+                    end_time=None,
+                    start_time=None,
+                )
+                eatery_hours_and_menus.append((eatery_hour, []))
+
+    return merge_campus_hours(eatery_hours_and_menus, dining_items), dining_items
+
+
+def merge_campus_hours(hours_and_menus, dining_items=None):
+    """Merges invalid events with valid events.
+
+    Combines events with no menu and a start_time equal to the end_time of the previous event on the same date
+    into that event, keeping the end time of the invalid event. Events whose first menu station matches the
+    previous event's are merged the same way.
+
+    Returns hours_and_menus without the merged events.
+
+    Args:
+        hours_and_menus (list): tuples of CampusEateryHour objects and their unparsed menus, in event order
+        dining_items (list): the dining items of the eatery, which are served at every event
+    """
+    merged = []
+    base_hour = base_station = None
+    for eatery_hour, menu_json in hours_and_menus:
+        station = get_first_station(menu_json, dining_items) if eatery_hour.start_time else None
+        if (
+            base_hour is not None
+            and eatery_hour.date == base_hour.date
+            and eatery_hour.start_time
+            and eatery_hour.start_time == base_hour.end_time
+            and base_station is not None
+            and (station is None or station == base_station)
+        ):
+            base_hour.end_time = eatery_hour.end_time
+            base_hour.end_timestamp = eatery_hour.end_timestamp
+            continue
+        merged.append((eatery_hour, menu_json))
+        base_hour, base_station = eatery_hour, station
+    return merged
+
+
+def get_first_station(menu_json, dining_items=None):
+    """Returns the items of the first menu station an event is served with as a list of (item, healthy) tuples, or
+    None if the event has no menu. Mirrors the categories and items parse_menu_categories stores.
+
+    Args:
+        menu_json (list): the unparsed menu of an event
+        dining_items (list): the dining items of the eatery, stored as the last station of every event
+    """
+    menu_json = menu_json or []
+    stations = [menu.get("items", []) for menu in menu_json if menu.get("category")]
+    if any(not menu.get("category") and menu.get("item") for menu in menu_json):
+        stations = [menu_json]
+    if not stations and dining_items:
+        stations = [dining_items]
+    if not stations:
+        return None
+    return [(item.get("item", ""), bool(item.get("healthy", False))) for item in stations[0]]
 
 
 def parse_menu_categories(menu_json, hour_model, eatery_id):
@@ -167,7 +217,7 @@ def parse_static_eateries(static_json):
       static_json (dict): A valid dictionary in the format of the dynamic Cornell Dining json for static eateries
     """
     static_eateries = []
-    attributes_json = requests.get(STATIC_ATTRIBUTES_URL).json()
+    attributes_json = fetch_json(STATIC_ATTRIBUTES_URL)
     for eatery in static_json["eateries"]:
         brbs, cash, cornell_card, credit, mobile, swipes = parse_payments(eatery["payMethods"])
         latitude, longitude = parse_coordinates(eatery)
@@ -200,80 +250,81 @@ def parse_static_eateries(static_json):
     return static_eateries
 
 
-def parse_static_op_hours(data_json, eatery_model):
-    """Parses a Cornell Dining json dictionary.
+def parse_static_schedule(eatery, eatery_model):
+    """Compiles the weekly hours of a static eatery into rules, which queries expand into hours for any dates.
 
-    Returns a list of tuples of CampusEateryHour objects for a corresponding CampusEatery object and their unparsed
-    menu.
+    Returns 1) a list of CampusEateryRule objects, the events of each weekday in order, merged like merge_campus_hours
+    merges them, or a single rule without times for a weekday without events 2) a list of CampusEateryClosure
+    objects, one per entry of datesClosed. The eatery's dining items are served at every event, and are stored once
+    by the caller.
 
     Args:
-        data_json (dict): a valid dictionary from the Cornell Dining json
-        eatery_model (CampusEatery): the CampusEatery object to which to link the hours.
+        eatery (dict): the eatery's entry in the static eateries json, or None if it is not listed there
+        eatery_model (CampusEatery): the CampusEatery object to which to link the rules.
     """
-    today = get_today()
-    for eatery in data_json["eateries"]:
-        if eatery_model.slug == eatery.get("slug", ""):
-            weekdays = {}
-
-            hours_list = eatery.get("operatingHours", [])
-            dining_items = eatery.get("diningItems")
-            dates_closed = eatery.get("datesClosed", [])
-
-            for hours in hours_list:
-                if "-" in hours["weekday"]:
-                    start, end = hours["weekday"].split("-")
-                    start_index = WEEKDAYS[start]
-                    end_index = WEEKDAYS[end]
-                    days = []
-                    idx = start_index
-                    while idx != end_index:
-                        days.append(idx)
-                        idx = (idx + 1) % 7
-                    days.append(end_index)
-                else:
-                    days = [WEEKDAYS[hours["weekday"]]]
-                for weekday in days:
-                    if weekday not in weekdays:
-                        weekdays[weekday] = hours["events"]
-
-            new_operating_hours = []
-            for i in range(NUM_DAYS_STORED_IN_DB):
-                new_date = today + timedelta(days=i)
-                for dates in dates_closed:  # check if dates_closed contains new_date
-                    if "-" in dates:  # indicates this string is a date range of form "mm/dd/yy-mm/dd/yy"
-                        start_date, end_date = string_to_date_range(dates)
-                        if start_date <= new_date <= end_date:
-                            break
-                    else:  # date string is a singular date
-                        closed_date = datetime.strptime(dates, "%m/%d/%y").date()
-                        if new_date == closed_date:
-                            break
-                else:
-                    # new_date is not present in dates_closed, we can add this date to the db
-                    new_events = weekdays.get(new_date.weekday(), [])
-
-                    for event in new_events:
-                        start, end = format_time(event.get("start", ""), event.get("end", ""), new_date.isoformat())
-                        new_operating_hours.append(
-                            (
-                                CampusEateryHour(
-                                    eatery_id=eatery_model.id,
-                                    date=new_date.isoformat(),
-                                    event_description=event.get("descr", ""),
-                                    event_summary=event.get("calSummary", ""),
-                                    end_time=end,
-                                    start_time=start,
-                                ),
-                                dining_items,
-                            )
-                        )
-                    if not new_events:
-                        new_operating_hours.append(
-                            (CampusEateryHour(eatery_id=eatery_model.id, date=new_date.isoformat()), dining_items)
-                        )
-
-            return new_operating_hours
-    return []
+    if eatery is None:
+        return [], []
+
+    weekdays = {}
+
+    hours_list = eatery.get("operatingHours", [])
+    dates_closed = eatery.get("datesClosed", [])
+    # every event is served with the dining items, so touching events are merged whenever there are any
+    mergeable = get_first_station(eatery.get("diningItems")) is not None
+
+    for hours in hours_list:
+        if "-" in hours["weekday"]:
+            start, end = hours["weekday"].split("-")
+            start_index = WEEKDAYS[start]
+            end_index = WEEKDAYS[end]
+            days = []
+            idx = start_index
+            while idx != end_index:
+                days.append(idx)
+                idx = (idx + 1) % 7
+            days.append(end_index)
+        else:
+            days = [WEEKDAYS[hours["weekday"]]]
+        for weekday in days:
+            if weekday not in weekdays:
+                weekdays[weekday] = hours["events"]
+
+    rules = []
+    for weekday in range(7):
+        weekday_rules = []
+        for event in weekdays.get(weekday, []):
+            start, end, overnight = format_event_times(event.get("start", ""), event.get("end", ""))
+            last_rule = weekday_rules[-1] if weekday_rules else None
+            if mergeable and last_rule is not None and not last_rule.overnight and start == last_rule.end_time:
+                last_rule.end_time = end
+                last_rule.overnight = overnight
+                continue
+            weekday_rules.append(
+                CampusEateryRule(
+                    eatery_id=eatery_model.id,
+                    weekday=weekday,
+                    event_description=event.get("descr", ""),
+                    event_summary=event.get("calSummary", ""),
+                    end_time=end,
+                    start_time=start,
+                    overnight=overnight,
+                )
+            )
+        rules += weekday_rules or [CampusEateryRule(eatery_id=eatery_model.id, weekday=weekday, overnight=False)]
+
+    closures = []
+    for closed_dates in dates_closed:
+        if "-" in closed_dates:  # indicates this string is a date range of form "mm/dd/yy-mm/dd/yy"
+            start_date, end_date = string_to_date_range(closed_dates)
+        else:  # date string is a singular date
+            start_date = end_date = datetime.strptime(closed_dates, "%m/%d/%y").date()
+        closures.append(
+            CampusEateryClosure(
+                eatery_id=eatery_model.id, start_date=start_date.isoformat(), end_date=end_date.isoformat()
+            )
+        )
+
+    return rules, closures
 
 
 def parse_campus_area(eatery):
@@ -338,5 +389,5 @@ def get_trillium_menu():
     Returns the Trillium dining items (using parse_dining_items) from the static json source
     for menus.
     """
-    static_json = requests.get(STATIC_MENUS_URL).json()
+    static_json = fetch_json(STATIC_MENUS_URL)
     return parse_dining_items(static_json["Trillium"][0])
@@ -1,9 +1,5 @@
-from datetime import timedelta
-import requests
-
-from .common_eatery import format_time, get_image_url, parse_coordinates
-from ..constants import NUM_DAYS_STORED_IN_DB, STATIC_CTOWN_HOURS_URL, get_today
-from ..database import CollegetownEatery, CollegetownEateryHour
+from .common_eatery import format_event_times, get_image_url, parse_coordinates
+from ..database import CollegetownEatery, CollegetownEateryRule
 
 
 def parse_collegetown_eateries(collegetown_data):
@@ -13,7 +9,7 @@ def parse_collegetown_eateries(collegetown_data):
 
     Args:
         collegetown_data (dict): A valid json dictionary from Yelp that contains eatery information
-  """
+    """
     collegetown_eateries = []
 
     for eatery in collegetown_data:
@@ -44,54 +40,47 @@ def parse_collegetown_eateries(collegetown_data):
     return collegetown_eateries
 
 
-def parse_collegetown_hours(data_json, eatery_model):
-    """Parses the hours of a Collegetown eatery.
+def parse_collegetown_schedule(eatery, eatery_model, static_eatery=None):
+    """Compiles the weekly hours of a Collegetown eatery into rules, which queries expand into hours for any dates.
 
-    Returns a list of CollegetownEateryHours that are associated to a specifc Collegetown Eatery.
+    Returns a list of CollegetownEateryRules that are associated to a specifc Collegetown Eatery, the events of each
+    weekday in order, or a single rule without times for a weekday without events.
 
     Args:
-        data_json (dict): A valid json dictionary from Yelp that contains eatery information
-        eater_model (CollegetownEatery): The eatery to which to bind the hours.
+        eatery (dict): the eatery's entry in the Yelp json, or None if it is not listed there
+        eater_model (CollegetownEatery): The eatery to which to bind the rules.
+        static_eatery (dict): the eatery's entry in the static Collegetown hours json, whose hours replace Yelp's
     """
-    today = get_today()
-    for eatery in data_json:
-        if eatery_model.url == eatery.get("url", ""):
-            hours_list = eatery.get("hours", [{}])[0].get("open", [])
-            # gets open hours from first dictionary in hours, empty dict-list provided to mimic hours format
-
-            eatery_alias = eatery.get("alias", "")
-            # these hours are not on Yelp and need to be queried from another source
-            static_eateries = requests.get(STATIC_CTOWN_HOURS_URL).json()
-            for static_eatery in static_eateries["eateries"]:
-                if static_eatery["alias"] == eatery_alias:
-                    hours_list = static_eatery.get("hours", [{}])[0].get("open", [])
-                    break
-
-            new_operating_hours = []
-
-            for i in range(NUM_DAYS_STORED_IN_DB):
-                new_date = today + timedelta(days=i)
-                new_events = [event for event in hours_list if event["day"] == new_date.weekday()]
-                for event in new_events:
-                    start, end = format_time(
-                        event.get("start", ""),
-                        event.get("end", ""),
-                        new_date.isoformat(),
-                        is_24_hour_time=True,
-                        overnight=event.get("is_overnight", False),
-                    )
-                    new_operating_hours.append(
-                        CollegetownEateryHour(
-                            eatery_id=eatery_model.id,
-                            date=new_date.isoformat(),
-                            event_description="General",
-                            end_time=end,
-                            start_time=start,
-                        )
-                    )
-                if not new_events:
-                    new_operating_hours.append(
-                        CollegetownEateryHour(eatery_id=eatery_model.id, date=new_date.isoformat(),)
-                    )
-            return new_operating_hours
-    return []
+    if eatery is None:
+        return []
+
+    hours_list = eatery.get("hours", [{}])[0].get("open", [])
+    # gets open hours from first dictionary in hours, empty dict-list provided to mimic hours format
+
+    # these hours are not on Yelp and need to be queried from another source
+    if static_eatery is not None:
+        hours_list = static_eatery.get("hours", [{}])[0].get("open", [])
+
+    new_rules = []
+    for weekday in range(7):
+        new_events = [event for event in hours_list if event["day"] == weekday]
+        for event in new_events:
+            start, end, overnight = format_event_times(
+                event.get("start", ""),
+                event.get("end", ""),
+                is_24_hour_time=True,
+                overnight=event.get("is_overnight", False),
+            )
+            new_rules.append(
+                CollegetownEateryRule(
+                    eatery_id=eatery_model.id,
+                    weekday=weekday,
+                    event_description="General",
+                    end_time=end,
+                    start_time=start,
+                    overnight=overnight,
+                )
+            )
+        if not new_events:
+            new_rules.append(CollegetownEateryRule(eatery_id=eatery_model.id, weekday=weekday, overnight=False))
+    return new_rules
@@ -1,6 +1,9 @@
 from datetime import date, datetime, timedelta
+from hashlib import sha1
+import json
+import pytz
 
-from ..constants import IMAGES_URL
+from ..constants import IMAGES_URL, INGEST_VERSION
 from ..database import ExpandedMenuStation, ExpandedMenuItem, ExpandedMenuChoice
 
 
@@ -10,6 +13,25 @@ def format_time(start_time, end_time, start_date, is_24_hour_time=False, overnig
     Input comes in two forms depending on if it is collegetown eatery (24hr format).
     Some end times are 'earlier' than the start time, indicating we have rolled over to a new day.
     """
+    start_time, end_time, overnight = format_event_times(start_time, end_time, is_24_hour_time, overnight)
+
+    end_date = start_date
+    if overnight:
+        year, month, day = start_date.split("-")
+        next_day = date(int(year), int(month), int(day)) + timedelta(days=1)
+        end_date = next_day.isoformat()
+
+    new_start = "{}:{}".format(start_date, start_time)
+    new_end = "{}:{}".format(end_date, end_time)
+
+    return [new_start, new_end]
+
+
+def format_event_times(start_time, end_time, is_24_hour_time=False, overnight=False):
+    """Formats the start and end times of an eatery event without a date, as format_time does.
+
+    Returns a tuple of the formatted start and end times, e.g. 10:00AM, and whether the event ends on the next day.
+    """
     if is_24_hour_time:
         start = datetime.strptime(start_time, "%H%M")
         start_time = start.strftime("%I:%M%p")
@@ -22,16 +44,17 @@ def format_time(start_time, end_time, start_date, is_24_hour_time=False, overnig
         end = datetime.strptime(end_time, "%I:%M%p")
         end_time = end.strftime("%I:%M") + end_time[-2:].upper()
 
-    end_date = start_date
-    if overnight or (end.strftime("%p") == "AM" and end < start):
-        year, month, day = start_date.split("-")
-        next_day = date(int(year), int(month), int(day)) + timedelta(days=1)
-        end_date = next_day.isoformat()
+    return start_time, end_time, overnight or (end.strftime("%p") == "AM" and end < start)
 
-    new_start = "{}:{}".format(start_date, start_time)
-    new_end = "{}:{}".format(end_date, end_time)
 
-    return [new_start, new_end]
+def get_timestamp(time_str):
+    """Returns the epoch timestamp (seconds) of a time formatted by format_time.
+
+    Args:
+        time_str (string): a US/Eastern time of the form <isodate>:<time>, e.g. 2019-10-12:11:00AM
+    """
+    naive_time = datetime.strptime(time_str, "%Y-%m-%d:%I:%M%p")
+    return int(pytz.timezone("US/Eastern").localize(naive_time).timestamp())
 
 
 def get_image_url(slug):
@@ -60,25 +83,47 @@ def parse_coordinates(eatery):
     return latitude, longitude
 
 
-def parse_expanded_menu(menus, eatery_model):
+def hash_json(*fragments):
+    """Hashes json fragments of an upstream resource.
+
+    Returns a hex digest that changes whenever the content of the fragments or INGEST_VERSION does.
+    """
+    content = json.dumps([INGEST_VERSION, fragments], sort_keys=True, default=str)
+    return sha1(content.encode()).hexdigest()
+
+
+def index_by(entries, key):
+    """Indexes upstream json entries by one of their fields, so that each eatery's entry is looked up instead of
+    found by scanning every entry.
+
+    Returns a dict mapping each value of key to the first entry that has it, entries without it being indexed by "".
+
+    Args:
+        entries (list): json dictionaries, e.g. the eateries of a Cornell Dining or Yelp response
+        key (string): the field to index by, e.g. "slug"
+    """
+    index = {}
+    for entry in entries:
+        index.setdefault(entry.get(key, ""), entry)
+    return index
+
+
+def parse_expanded_menu(menu, eatery_model):
     """Parses the expanded menu of an eatery.
 
     Returns a tuple of ExpandedMenuStation type available in the external expandedItems resource and the corresponding
     json for items
 
     Args:
-        menu (dict): A valid json segment from the static expanded menu resource.
+        menu (dict): The eatery's entry in the static expanded menu resource, or None if it has no expanded menu.
         eatery_model (CampusEatery): A valid campus eatery to which to link the menu object.
     """
     items = []
 
-    for menu in menus["eateries"]:
-        if menu["slug"] == eatery_model.slug:
-            for station in menu["stations"]:
-                expanded_menu = ExpandedMenuStation(
-                    campus_eatery_id=eatery_model.id, station_category=station["station"]
-                )
-                items.append((expanded_menu, station["diningItems"]))
+    if menu is not None:
+        for station in menu["stations"]:
+            expanded_menu = ExpandedMenuStation(campus_eatery_id=eatery_model.id, station_category=station["station"])
+            items.append((expanded_menu, station["diningItems"]))
     return items
 
 
@@ -23,7 +23,6 @@ from ..constants import (
 from ..database import SwipeData
 from .common_eatery import string_to_date_range
 
-
 weekdays = {v: k for k, v in WEEKDAYS.items()}  # inverting to convert strings to indexes [0,6]
 breaks = {}
 for label, dates in SCHOOL_BREAKS.items():
@@ -306,6 +305,7 @@ def export_data(file_path, eatery_models):
 
                 new_timeblock = SwipeData(
                     eatery_id=eatery_id,
+                    date=today.isoformat(),
                     end_time=fmt_date + end_time.strftime("%I:%M%p"),
                     session_type=session_type,
                     start_time=fmt_date + start_time.strftime("%I:%M%p"),
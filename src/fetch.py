@@ -0,0 +1,492 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import gzip
+from glob import glob
+from hashlib import sha1
+import io
+import json
+import os
+import random
+import shutil
+from threading import Lock
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .constants import (
+    FETCH_CACHE_PATH,
+    FETCH_CHUNK_SIZE,
+    FETCH_CONNECT_TIMEOUT,
+    FETCH_RETRIES,
+    FETCH_RETRY_BACKOFF,
+    FETCH_THREADS,
+    FETCH_TIMEOUT,
+    FETCH_TTL_SPREAD,
+    RECORDING_VERSION,
+    RECORDINGS_PATH,
+    STATIC_SOURCES_PATH,
+    STATIC_SOURCES_URL,
+)
+
+_json_decoder = json.JSONDecoder()
+_lock = Lock()
+_url_locks = {}  # held while a url is fetched, so concurrent callers wait for the same fetch
+_run_data = {}
+_run_paths = {}  # maps each url fetched in this run to the path of its body
+_run_changed = set()
+_run_sources = None  # urls requested again in this run, or None for every url
+_local_data = {}  # maps the path of each local source read by this process to its version and parsed json
+_recording = None  # the directory and manifest of the recording in progress, if any
+_replay = None  # the directory and manifest of the recording being replayed, if any
+
+# keeps connections to each host alive across requests, and retries failed connections and server errors
+_session = requests.Session()
+_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_maxsize=FETCH_THREADS,
+        max_retries=Retry(
+            total=FETCH_RETRIES,
+            backoff_factor=FETCH_RETRY_BACKOFF,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        ),
+    ),
+)
+
+
+def start_fetch_run(sources=None):
+    """Forgets the data fetched by the previous run, so urls are requested again, at most once, in this one.
+
+    Args:
+        sources (list): the urls to request again; other urls reuse the body kept by an earlier run when there is one.
+            Every url is requested again if sources is None.
+    """
+    global _run_sources
+    with _lock:
+        _run_data.clear()
+        _run_paths.clear()
+        _run_changed.clear()
+        _run_sources = None if sources is None else set(sources)
+
+
+def fetch_json(url):
+    """Fetches and parses a json resource, once per run.
+
+    Static sources are read from STATIC_SOURCES_PATH unless the STATIC_SOURCES environment variable is "remote" or the
+    file is missing, and only parsed again once the file changes. Other urls are requested, and their body is kept on
+    disk along with its ETag and Last-Modified headers; later runs send them back as a conditional request, reusing
+    the kept body when the server answers 304 Not Modified, or reuse it without a request if the url is not one of
+    the run's sources. Only the run's sources count as changed, so a change is left for the run that refreshes it.
+
+    While a recording is replayed, the recorded json is returned instead, and the url always counts as changed.
+
+    Returns the parsed json, which is shared by every caller in the run and must not be modified.
+    """
+    path = _get_body_path(url)
+    with _url_locks[url]:
+        if url not in _run_data:
+            if path == get_local_source_path(url):
+                data = _load_local(path)
+            else:
+                with _open_body(path) as body_file:
+                    data = json.load(body_file)
+            with _lock:
+                _run_data[url] = data
+        return _run_data[url]
+
+
+def fetch_items(url, keys):
+    """Fetches a json resource like fetch_json, but parses only the array found by following keys from its root, one
+    item at a time, so that at most one item is held in memory. Values before the array are parsed to be skipped.
+
+    Yields each item of the array, in order.
+
+    Raises KeyError if one of keys is missing, and ValueError if the body is not valid json.
+
+    Args:
+        url (string): the url of the json
+        keys (list): the keys of the objects enclosing the array, outermost first, e.g. ["data", "eateries"]
+    """
+    with _open_body(_get_body_path(url)) as body_file:
+        stream = _JsonStream(io.TextIOWrapper(body_file, encoding="utf-8"))
+        for key in keys:
+            stream.find_key(key)
+        yield from stream.iter_array()
+
+
+def fetch_all(urls):
+    """Fetches urls at the same time, from up to FETCH_THREADS threads, so that later fetch_json and fetch_items calls
+    of the run reuse their bodies. Bodies are written to disk without being parsed.
+    """
+    with ThreadPoolExecutor(max_workers=FETCH_THREADS) as executor:
+        list(executor.map(_get_body_path, urls))
+
+
+def fetch_changed():
+    """Returns the urls fetched in this run whose bodies differ from the ones kept by the previous run."""
+    with _lock:
+        return set(_run_changed)
+
+
+def fetch_with_ttl(key, query, ttl):
+    """Fetches json that has no url to request conditionally, like Yelp responses, through a cache on disk.
+
+    Each entry is written as soon as it is fetched, so a run that is interrupted resumes where it stopped, and expires
+    at a random point of the last FETCH_TTL_SPREAD seconds (at most half) of its ttl, so entries fetched together are
+    refreshed at different times. If query fails, the expired entry is returned instead when there is one. While a
+    recording is replayed, the recorded json is returned instead, and query is never called.
+
+    Returns the json returned by query, or kept under key.
+
+    Args:
+        key (string): names the entry, e.g. "yelp:business:<id>"
+        query (function): fetches the json
+        ttl (int): the most seconds an entry is kept for
+    """
+    if _replay is not None:
+        return _load_recorded(key)
+
+    body_path, meta_path = _get_cache_paths(key)
+    meta = _read_meta(meta_path) if os.path.exists(body_path) else {}
+    if meta.get("expires", 0) > time.time():
+        with open(body_path) as body_file:
+            data = json.load(body_file)
+    else:
+        try:
+            data = query()
+        except Exception as e:
+            if not meta:
+                raise
+            print("Fetching {} failed, using the expired entry: {}".format(key, e))
+            with open(body_path) as body_file:
+                data = json.load(body_file)
+        else:
+            expires = time.time() + ttl - random.uniform(0, min(ttl / 2, FETCH_TTL_SPREAD))
+            _write_file(body_path, json.dumps(data).encode())
+            _write_file(meta_path, json.dumps({"expires": expires, "url": key}).encode())
+    _record(key, data)
+    return data
+
+
+def track_json(key, data):
+    """Records a hash of json fetched outside of fetch_json, like the Yelp eateries, so that fetch_changed reports key
+    once it changes.
+    """
+    with _lock:
+        _record_version(key, None, sha1(json.dumps(data, sort_keys=True).encode()).hexdigest())
+
+
+def track_file(path):
+    """Records the version of a local file other than the static sources, like the swipe log, so that fetch_changed
+    reports it once it changes.
+    """
+    with _lock:
+        _record_version(path, path, _get_version(path))
+
+
+def forget_changes():
+    """Forgets the sources that changed in this run, so the next run sees them as changed again. Used when the update
+    they were fetched for fails.
+    """
+    with _lock:
+        for url in _run_changed:
+            _, meta_path = _get_cache_paths(url)
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+
+
+@contextmanager
+def recording(path=None):
+    """Records every upstream response fetched inside the block, Yelp's included, so that updates can be replayed
+    without network access. Each response is written gzipped as soon as it is fetched, and the block ends by writing
+    a manifest.json naming the file of each url, along with RECORDING_VERSION.
+
+    Yields the path of the recording.
+
+    Args:
+        path (string): the directory to record to; a new directory of RECORDINGS_PATH named after the current time if
+            None
+    """
+    global _recording
+    if path is None:
+        path = os.path.join(RECORDINGS_PATH, datetime.now().strftime("%Y%m%d%H%M%S"))
+    os.makedirs(path, exist_ok=True)
+    manifest = {"created_at": datetime.now().isoformat(), "responses": {}, "version": RECORDING_VERSION}
+    _recording = (path, manifest)
+    try:
+        yield path
+    finally:
+        _recording = None
+        _write_file(os.path.join(path, "manifest.json"), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+
+@contextmanager
+def replaying(path):
+    """Serves every upstream response fetched inside the block from the recording at path, so no request is sent.
+    Every url replayed through fetch_json counts as changed, so updates are never skipped, and is requested again by
+    the first update after the block.
+
+    Raises ValueError if the recording was written in another format than RECORDING_VERSION.
+    """
+    global _replay
+    with open(os.path.join(path, "manifest.json")) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("version") != RECORDING_VERSION:
+        raise ValueError(
+            "recording {} has version {}, expected {}".format(path, manifest.get("version"), RECORDING_VERSION)
+        )
+    _replay = (path, manifest)
+    try:
+        yield
+    finally:
+        _replay = None
+        forget_changes()
+
+
+def get_latest_recording():
+    """Returns the path of the newest recording in RECORDINGS_PATH, or None if there is none."""
+    manifests = sorted(glob(os.path.join(RECORDINGS_PATH, "*", "manifest.json")))
+    return os.path.dirname(manifests[-1]) if manifests else None
+
+
+def get_local_source_path(url):
+    """Returns the path of the local copy of a static source, or None if the url should be requested instead."""
+    if os.environ.get("STATIC_SOURCES", "local") != "local" or not url.startswith(STATIC_SOURCES_URL):
+        return None
+    path = os.path.join(STATIC_SOURCES_PATH, url.split(STATIC_SOURCES_URL, 1)[1])
+    return path if os.path.isfile(path) else None
+
+
+def _get_body_path(url):
+    """Fetches url at most once per run, as described by fetch_json.
+
+    Returns the path of the body: a local static source, a body kept in FETCH_CACHE_PATH, or a gzipped recording.
+    """
+    with _lock:
+        url_lock = _url_locks.setdefault(url, Lock())
+    with url_lock:
+        if url not in _run_paths:
+            local_path = get_local_source_path(url)
+            if _replay is not None:
+                path = _get_recorded_path(url)
+                with _lock:
+                    _run_changed.add(url)
+            elif local_path is not None:
+                path = local_path
+                if _run_sources is None or url in _run_sources:
+                    with _lock:
+                        _record_version(url, path, _get_version(path))
+            else:
+                path = _fetch(url)
+            _record_file(url, path)
+            with _lock:
+                _run_paths[url] = path
+        return _run_paths[url]
+
+
+def _open_body(path):
+    return gzip.open(path) if path.endswith(".gz") else open(path, "rb")
+
+
+def _load_local(path):
+    version = _get_version(path)
+    if path not in _local_data or _local_data[path][0] != version:
+        with open(path) as source_file:
+            _local_data[path] = (version, json.load(source_file))
+    return _local_data[path][1]
+
+
+def _record(url, data):
+    if _recording is not None:
+        _write_file(_get_recording_path(url), gzip.compress(json.dumps(data).encode()))
+
+
+def _record_file(url, path):
+    if _recording is None:
+        return
+    recorded_path = _get_recording_path(url)
+    temp_path = recorded_path + ".tmp"
+    with open(path, "rb") as body_file, gzip.open(temp_path, "wb") as recorded_file:
+        shutil.copyfileobj(body_file, recorded_file, FETCH_CHUNK_SIZE)
+    os.replace(temp_path, recorded_path)
+
+
+def _get_recording_path(url):
+    path, manifest = _recording
+    file_name = sha1(url.encode()).hexdigest() + ".json.gz"
+    with _lock:
+        manifest["responses"][url] = file_name
+    return os.path.join(path, file_name)
+
+
+def _get_recorded_path(url):
+    path, manifest = _replay
+    if url not in manifest["responses"]:
+        raise KeyError("{} is missing from recording {}".format(url, path))
+    return os.path.join(path, manifest["responses"][url])
+
+
+def _load_recorded(url):
+    with gzip.open(_get_recorded_path(url)) as recorded_file:
+        return json.load(recorded_file)
+
+
+def _get_version(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _record_version(url, path, version):
+    _, meta_path = _get_cache_paths(url)
+    if _read_meta(meta_path).get("version") != version:
+        _run_changed.add(url)
+        _write_file(meta_path, json.dumps({"path": path, "url": url, "version": version}).encode())
+
+
+def _fetch(url):
+    """Requests url conditionally, streaming a new body to disk, and returns the path of the body kept for url."""
+    body_path, meta_path = _get_cache_paths(url)
+    meta = _read_meta(meta_path) if os.path.exists(body_path) else {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    if meta and _run_sources is not None and url not in _run_sources:
+        return body_path
+
+    with _session.get(url, headers=headers, stream=True, timeout=(FETCH_CONNECT_TIMEOUT, FETCH_TIMEOUT)) as response:
+        if response.status_code == 304 and meta:
+            return body_path
+        response.raise_for_status()
+
+        body_hash = sha1()
+        temp_path = body_path + ".tmp"
+        os.makedirs(FETCH_CACHE_PATH, exist_ok=True)
+        with open(temp_path, "wb") as temp_file:
+            for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+                body_hash.update(chunk)
+                temp_file.write(chunk)
+
+    if not meta or meta.get("sha1") != body_hash.hexdigest():
+        with _lock:
+            _run_changed.add(url)
+    meta = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha1": body_hash.hexdigest(),
+        "url": url,
+    }
+    os.replace(temp_path, body_path)
+    _write_file(meta_path, json.dumps(meta).encode())
+    return body_path
+
+
+def _get_cache_paths(url):
+    key = sha1(url.encode()).hexdigest()
+    return os.path.join(FETCH_CACHE_PATH, key + ".body"), os.path.join(FETCH_CACHE_PATH, key + ".json")
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as temp_file:
+        temp_file.write(content)
+    os.replace(temp_path, path)
+
+
+class _JsonStream:
+    """Reads json values one at a time from a text file, holding only the unread part of the current value."""
+
+    def __init__(self, text_file):
+        self.text_file = text_file
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def find_key(self, key):
+        """Moves into the object that starts at the current position, past the key and colon of its entry for key.
+        Values of the entries before it are parsed and dropped.
+
+        Raises KeyError if the object has no entry for key.
+        """
+        self.expect("{")
+        while self.peek() != "}":
+            name = self.decode()
+            self.expect(":")
+            if name == key:
+                return
+            self.decode()
+            if self.peek() == ",":
+                self.position += 1
+        raise KeyError(key)
+
+    def iter_array(self):
+        """Yields each value of the array that starts at the current position."""
+        self.expect("[")
+        if self.peek() == "]":
+            return
+        while True:
+            yield self.decode()
+            char = self.peek()
+            if char not in (",", "]"):
+                raise ValueError("expected ',' or ']' in json, found {!r}".format(char))
+            self.position += 1
+            if char == "]":
+                return
+
+    def decode(self):
+        """Returns the json value that starts at the current position, and moves past it."""
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # a number that reaches the last characters read, like "-2." of "-2.5", may continue in the next chunk
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in "+-.0123456789Ee"):
+                    self.position = end
+                    return value
+            # reading as much as is buffered keeps the parsing of a long value linear in its length
+            self.read(max(FETCH_CHUNK_SIZE, len(self.buffer) - self.position))
+
+    def peek(self):
+        """Returns the next character that is not whitespace, without moving past it, or "" at the end of the file."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\n\r":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                return ""
+            self.read(FETCH_CHUNK_SIZE)
+
+    def expect(self, char):
+        """Moves past char, the next character that is not whitespace.
+
+        Raises ValueError if the next character is another one.
+        """
+        if self.peek() != char:
+            raise ValueError("expected {!r} in json, found {!r}".format(char, self.peek()))
+        self.position += 1
+
+    def read(self, size):
+        chunk = self.text_file.read(size)
+        start, self.position = self.position, 0
+        self.buffer = self.buffer[start:] + chunk
+        self.eof = not chunk
@@ -1,4 +1,5 @@
 # flake8: noqa
 
-from .campus_eatery import get_campus_eateries
-from .collegetown_eatery import get_collegetown_eateries
+from .campus_eatery import campus_eatery_criteria, get_campus_eateries
+from .collegetown_eatery import collegetown_eatery_criteria, get_collegetown_eateries
+from .snapshot import get_snapshot
@@ -1,6 +1,14 @@
-from ..db import conn
-from ..database import CollegetownEatery, CollegetownEateryHour
-from ..gql_parser.common_eatery import parse_coordinates
+from ..db import get_connection
+from ..database import CollegetownEatery, CollegetownEateryRule
+from ..gql_parser.common_eatery import (
+    EateryLoader,
+    fetch_schedules,
+    get_schedule_dates,
+    parse_coordinates,
+    parse_date_range,
+    parse_open_intervals,
+    payment_method_criteria,
+)
 from ..gql_types import (
     CollegetownEateryType,
     CollegetownEventType,
@@ -21,24 +29,53 @@ def get_collegetown_eateries(eatery_id):
     else:
         query = CollegetownEatery.query
 
-    result = conn.execute(query.statement).fetchall()
+    result = get_connection().execute(query.statement).fetchall()
     columns = CollegetownEatery.__table__.columns.keys()
 
-    populated_result = []
+    eateries = []
     for data in result:
         mapped_eatery = {}
         for i, column_name in enumerate(columns):
             mapped_eatery[column_name] = data[i]
-        populated_eatery = parse_collegetown_eateries(mapped_eatery)
-        populated_result.append(populated_eatery)
+        eateries.append(mapped_eatery)
+
+    loader = CollegetownEateryLoader([eatery["id"] for eatery in eateries])
+    return [parse_collegetown_eateries(eatery, loader) for eatery in eateries]
+
+
+def collegetown_eatery_criteria(payment_methods=None, price=None):
+    """Translates the filter arguments of the collegetownEateries field into filters on CollegetownEatery.
 
-    return populated_result
+    Returns a list of filters, empty if no filter argument was given.
+    """
+    criteria = payment_method_criteria(CollegetownEatery, payment_methods)
+    if price is not None:
+        criteria.append(CollegetownEatery.price == price)
+    return criteria
+
+
+class CollegetownEateryLoader(EateryLoader):
+    """Loads the operating hours and open intervals of Collegetown eateries when they are first resolved."""
+
+    def __init__(self, eatery_ids):
+        super(CollegetownEateryLoader, self).__init__(
+            eatery_ids,
+            {
+                "operating_hours": parse_collegetown_hours,
+                "open_intervals": lambda ids: parse_open_intervals(
+                    ids, schedules=fetch_schedules(CollegetownEateryRule, ids)
+                ),
+            },
+        )
 
+    def operating_hours(self, eatery_id, info, start_date=None, end_date=None, days=None):
+        return self.load_dates("operating_hours", eatery_id, parse_date_range(start_date, end_date, days))
 
-def parse_collegetown_eateries(eatery):
+
+def parse_collegetown_eateries(eatery, loader):
     """Parses eatery data from db and populates to an object.
 
-    Returns a new CollegetownEateryType.
+    Returns a new CollegetownEateryType whose operating hours are resolved through loader.
     """
     new_eatery = CollegetownEateryType(
         address=eatery.get("address", ""),
@@ -48,7 +85,6 @@ def parse_collegetown_eateries(eatery):
         id=eatery.get("id"),
         image_url=eatery.get("image_url"),
         name=eatery.get("name", ""),
-        operating_hours=parse_collegetown_hours(eatery),
         payment_methods=PaymentMethodsType(
             brbs=False, cash=True, cornell_card=False, credit=True, swipes=False, mobile=False
         ),
@@ -59,6 +95,7 @@ def parse_collegetown_eateries(eatery):
         rating_enum=parse_rating(eatery),
         url=eatery.get("url", ""),
     )
+    new_eatery.loader = loader
     return new_eatery
 
 
@@ -78,45 +115,32 @@ def parse_categories(eatery):
     Returns a list of strings.
     """
     categories_arr = eatery.get("categories", "").split(", ")
-    categories = map(lambda x: x[1:-1], categories_arr)
+    categories = [category[1:-1] for category in categories_arr]
     return categories
 
 
-def parse_collegetown_hours(eatery):
-    """Queries db for operating hours then parses the information into appropriate data format.
+def parse_collegetown_hours(eatery_ids, start_date=None, end_date=None):
+    """Queries db for the schedules of the given eateries then expands them into operating hours for the dates of
+    get_schedule_dates.
 
-    Returns a list CollegetownHoursType objects.
+    Returns a dict mapping each eatery id to a list of CollegetownHoursType objects, limited to the dates between
+    start_date and end_date (inclusive ISO date strings) if they are given.
     """
-    query = CollegetownEateryHour.query.filter_by(eatery_id=eatery.get("id"))
-    result = conn.execute(query.statement).fetchall()
-    columns = CollegetownEateryHour.__table__.columns.keys()
-
-    date_to_event = {}
-    for data in result:
-        mapped_hour = {}
-        for i, column_name in enumerate(columns):
-            mapped_hour[column_name] = data[i]
-
-        if not mapped_hour.get("start_time"):
-            date_to_event[mapped_hour["date"]] = []
-            continue
-
-        hour_event = CollegetownEventType(
-            description=mapped_hour.get("event_description", ""),
-            end_time=mapped_hour.get("end_time", ""),
-            start_time=mapped_hour.get("start_time", ""),
-        )
-
-        event_date = mapped_hour["date"]
-        if event_date in date_to_event:
-            date_to_event[event_date].append(hour_event)
-        else:
-            date_to_event[event_date] = [hour_event]
-
-    populated_result = []
-    dates_list = list(date_to_event.keys())
-    for date in dates_list:
-        new_hours = CollegetownHoursType(date=date, events=date_to_event.get(date, []))
-        populated_result.append(new_hours)
-
-    return populated_result
+    dates = get_schedule_dates(start_date, end_date)
+
+    eatery_to_hours = {}
+    for eatery_id, schedule in fetch_schedules(CollegetownEateryRule, eatery_ids).items():
+        populated_result = []
+        for date, events in schedule.expand(dates):
+            hour_events = [
+                CollegetownEventType(
+                    description=event.get("event_description", ""),
+                    end_time=event.get("end_time", ""),
+                    start_time=event.get("start_time", ""),
+                )
+                for event in events
+            ]
+            populated_result.append(CollegetownHoursType(date=date, events=hour_events))
+        eatery_to_hours[eatery_id] = populated_result
+
+    return eatery_to_hours
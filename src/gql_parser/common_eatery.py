@@ -1,6 +1,408 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+
+from graphql.language.ast import Field, FragmentSpread
+
+from ..constants import (
+    LOADER_MAX_DATE_RANGES,
+    SCHEDULE_DAYS,
+    SCHEDULE_MAX_DAYS,
+    SQLITE_MAX_VARIABLE_NUMBER,
+    get_today,
+)
+from ..db import get_connection, get_current_db_path, pinned_db, reference_db
+from ..eatery_db.common_eatery import get_timestamp
 from ..gql_types import CoordinatesType, PaymentMethodsEnum, PaymentMethodsType
 
 
+def fetch_rows(model, column, values, *criteria):
+    """Queries db for every row of a table whose column is one of the given values, in chunks that stay under
+    sqlite's limit on bound variables.
+
+    Returns a list of dicts that map column names to values.
+
+    Args:
+        model (Base): the database model to query
+        column (Column): the column of the model to filter on
+        values (list): the values to match the column against
+        criteria: additional filters applied to every chunk
+    """
+    columns = model.__table__.columns.keys()
+    values = list(values)
+    rows = []
+    while values:
+        partial_query = model.query.filter(column.in_(values[:SQLITE_MAX_VARIABLE_NUMBER]), *criteria)
+        partial_result = get_connection().execute(partial_query.statement).fetchall()
+        for row in partial_result:
+            rows.append({column_name: row[i] for i, column_name in enumerate(columns)})
+        values = values[SQLITE_MAX_VARIABLE_NUMBER:]
+    return rows
+
+
+def group_rows(rows, key):
+    """Groups rows by the value of one of their columns, preserving the order in which they were fetched.
+
+    Returns a dict that maps each value of the key column to the list of rows that have it.
+    """
+    grouped = {}
+    for row in rows:
+        if row[key] in grouped:
+            grouped[row[key]].append(row)
+        else:
+            grouped[row[key]] = [row]
+    return grouped
+
+
+class EateryLoader(object):
+    """Loads sections of eatery data, like operating hours, for a fixed set of eateries on first use.
+
+    Each section is parsed for every eatery of the loader in one batch and kept, so fields that a query doesn't select
+    never touch their tables, and later lookups for any eatery of the loader are free. Sections are read from the db
+    the loader was created on, which is kept on disk while the loader lives, even after an update publishes a new
+    one, and parsed again once the day changes, since hours expanded from schedules start at the current day.
+
+    Args:
+        eatery_ids (list): the ids of the eateries to load sections for
+        parsers (dict): maps each section name to a function that takes eatery ids and returns a dict mapping each
+            eatery id to its parsed section
+    """
+
+    def __init__(self, eatery_ids, parsers):
+        self.eatery_ids = eatery_ids
+        self.parsers = parsers
+        self.db_path = get_current_db_path()
+        self.db_reference = reference_db(self.db_path)
+        self.today = get_today()
+        self._sections = {}
+        self._ranges = OrderedDict()
+        self._lock = Lock()
+
+    def _check_today(self):
+        """Forgets every loaded section once the day changed since they were loaded."""
+        today = get_today()
+        if today != self.today:
+            with self._lock:
+                if today != self.today:
+                    self._sections = {}
+                    self._ranges.clear()
+                    self.today = today
+
+    def load(self, section, eatery_id, superset=None):
+        """Returns the given section of an eatery, parsing it for all eateries if needed.
+
+        If the section named by superset is already loaded and contains everything in section, it is used instead.
+        """
+        self._check_today()
+        if superset in self._sections:
+            section = superset
+        if section not in self._sections:
+            with self._lock:
+                if section not in self._sections:
+                    with pinned_db(self.db_path):
+                        self._sections[section] = self.parsers[section](self.eatery_ids)
+        return self._sections[section].get(eatery_id, [])
+
+    def load_dates(self, section, eatery_id, date_range):
+        """Returns the given section of an eatery, a list of objects with a date, limited to an inclusive date range.
+
+        If the whole section is already loaded and the range is within the SCHEDULE_DAYS days it expands schedules
+        for, it is filtered in memory. Otherwise only the dates in range are read from the db, for all eateries of the
+        loader; the most recent ranges are kept for later lookups.
+
+        Args:
+            date_range (tuple): start and end ISO date strings, either of which may be None, or None for all dates
+        """
+        if date_range is None:
+            return self.load(section, eatery_id)
+        self._check_today()
+        start_date, end_date = date_range
+        dates = get_schedule_dates()
+        if (
+            section in self._sections
+            and start_date is not None
+            and end_date is not None
+            and dates[0].isoformat() <= start_date
+            and end_date <= dates[-1].isoformat()
+        ):
+            return [
+                hours
+                for hours in self._sections[section].get(eatery_id, [])
+                if (start_date is None or start_date <= hours.date) and (end_date is None or hours.date <= end_date)
+            ]
+
+        key = (section, start_date, end_date)
+        with self._lock:
+            if key not in self._ranges:
+                with pinned_db(self.db_path):
+                    self._ranges[key] = self.parsers[section](self.eatery_ids, start_date, end_date)
+                while len(self._ranges) > LOADER_MAX_DATE_RANGES:
+                    self._ranges.popitem(last=False)
+            self._ranges.move_to_end(key)
+            return self._ranges[key].get(eatery_id, [])
+
+    def open_intervals(self, eatery_id):
+        """Returns the OpenIntervals of an eatery, loading the "open_intervals" section if needed."""
+        return self.load("open_intervals", eatery_id) or OpenIntervals([])
+
+    def warm(self):
+        """Loads every section up front."""
+        for section in self.parsers:
+            self.load(section, None)
+
+
+class OpenIntervals(object):
+    """The times an eatery is open, as sorted, non-overlapping intervals that answer "is it open" in O(log n).
+
+    Args:
+        events (list): (start_timestamp, end_timestamp, start_time, end_time) tuples of the eatery's events, in any
+            order; events that overlap or touch are merged
+    """
+
+    def __init__(self, events):
+        self.starts = []
+        self.ends = []
+        self.start_times = []
+        self.end_times = []
+        for start, end, start_time, end_time in sorted(events):
+            if self.ends and start <= self.ends[-1]:
+                if end > self.ends[-1]:
+                    self.ends[-1] = end
+                    self.end_times[-1] = end_time
+                continue
+            self.starts.append(start)
+            self.ends.append(end)
+            self.start_times.append(start_time)
+            self.end_times.append(end_time)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _find(self, timestamp):
+        """Returns the index of the last interval starting at or before timestamp, or -1 if there is none."""
+        return bisect_right(self.starts, timestamp) - 1
+
+    def is_open(self, timestamp):
+        i = self._find(timestamp)
+        return i >= 0 and timestamp < self.ends[i]
+
+    def closes_at(self, timestamp):
+        """Returns the end time of the interval that contains timestamp, or None if the eatery is closed."""
+        i = self._find(timestamp)
+        return self.end_times[i] if i >= 0 and timestamp < self.ends[i] else None
+
+    def next_open(self, timestamp):
+        """Returns the start time of the first interval that starts after timestamp, or None if there is none."""
+        i = self._find(timestamp) + 1
+        return self.start_times[i] if i < len(self.starts) else None
+
+
+class Schedule(object):
+    """The weekly hours of an eatery, stored as rules for each weekday and ranges of dates it is closed on, which are
+    expanded into the events of any dates in O(days).
+
+    Args:
+        rules (list): the eatery's rule rows (CampusEateryRule or CollegetownEateryRule) as dicts, in event order
+        closures (list): (start_date, end_date) tuples of the inclusive ISO date ranges the eatery is closed on
+    """
+
+    def __init__(self, rules, closures=()):
+        self.weekdays = {}
+        for rule in rules:
+            self.weekdays.setdefault(rule["weekday"], []).append(rule)
+        self.closed_starts = []
+        self.closed_ends = []
+        for start_date, end_date in sorted(closures):
+            if self.closed_ends and start_date <= self.closed_ends[-1]:
+                self.closed_ends[-1] = max(self.closed_ends[-1], end_date)
+                continue
+            self.closed_starts.append(start_date)
+            self.closed_ends.append(end_date)
+
+    def is_closed(self, date):
+        """Returns whether the eatery is closed on an ISO date."""
+        i = bisect_right(self.closed_starts, date) - 1
+        return i >= 0 and date <= self.closed_ends[i]
+
+    def expand(self, dates):
+        """Returns a list of (date, events) tuples for each of dates the eatery isn't closed on, where date is an ISO
+        date and events is a list of dicts of the columns of each rule of its weekday, with start_time and end_time
+        formatted like format_time formats them. Weekdays without events have an empty list of events.
+        """
+        days = []
+        for day in dates:
+            date = day.isoformat()
+            if day.weekday() not in self.weekdays or self.is_closed(date):
+                continue
+            events = []
+            for rule in self.weekdays[day.weekday()]:
+                if not rule["start_time"]:
+                    continue
+                end_date = (day + timedelta(days=1)).isoformat() if rule["overnight"] else date
+                event = {column: value for column, value in rule.items() if column != "id"}
+                event["start_time"] = "{}:{}".format(date, rule["start_time"])
+                event["end_time"] = "{}:{}".format(end_date, rule["end_time"])
+                events.append(event)
+            days.append((date, events))
+        return days
+
+
+def get_schedule_dates(start_date=None, end_date=None):
+    """Returns a list of the dates schedules are expanded for: from start_date, or today, to end_date, or the last of
+    SCHEDULE_DAYS days, but at most SCHEDULE_MAX_DAYS days.
+
+    Args:
+        start_date (string): the first date to include, as an ISO date
+        end_date (string): the last date to include, as an ISO date
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date is not None else get_today()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date is not None else None
+    days = SCHEDULE_DAYS if end is None else min((end - start).days + 1, SCHEDULE_MAX_DAYS)
+    return [start + timedelta(days=i) for i in range(days)]
+
+
+def fetch_schedules(rule_model, eatery_ids, closure_model=None):
+    """Queries db for the rules, and the closures if the eateries have any, of the given eateries.
+
+    Returns a dict mapping the id of each eatery with rules to a Schedule.
+
+    Args:
+        rule_model (Base): CampusEateryRule or CollegetownEateryRule
+        eatery_ids (list): the ids of the eateries
+        closure_model (Base): CampusEateryClosure, or None if the eateries are never closed on specific dates
+    """
+    eatery_to_rules = group_rows(fetch_rows(rule_model, rule_model.eatery_id, eatery_ids), "eatery_id")
+    eatery_to_closures = {}
+    if closure_model is not None:
+        eatery_to_closures = group_rows(fetch_rows(closure_model, closure_model.eatery_id, eatery_ids), "eatery_id")
+    return {
+        eatery_id: Schedule(
+            sorted(rules, key=lambda rule: rule["id"]),
+            [(closure["start_date"], closure["end_date"]) for closure in eatery_to_closures.get(eatery_id, [])],
+        )
+        for eatery_id, rules in eatery_to_rules.items()
+    }
+
+
+def parse_open_intervals(eatery_ids, model=None, schedules=None):
+    """Queries db for the timed events of the given eateries in an hours table (CampusEateryHour), and expands their
+    schedules from yesterday, whose overnight events may still be going on, through SCHEDULE_DAYS days from today.
+
+    Returns a dict mapping each eatery id to an OpenIntervals object.
+
+    Args:
+        eatery_ids (list): the ids of the eateries
+        model (Base): the hours table, or None if the eateries only have schedules
+        schedules (dict): maps eatery ids to their Schedules, as returned by fetch_schedules
+    """
+    eatery_to_events = {}
+    if model is not None:
+        for row in fetch_rows(model, model.eatery_id, eatery_ids, model.start_timestamp.isnot(None)):
+            event = (row["start_timestamp"], row["end_timestamp"], row["start_time"], row["end_time"])
+            eatery_to_events.setdefault(row["eatery_id"], []).append(event)
+
+    dates = [get_today() - timedelta(days=1)] + get_schedule_dates()
+    for eatery_id, schedule in (schedules or {}).items():
+        for _, events in schedule.expand(dates):
+            for event in events:
+                start, end = event["start_time"], event["end_time"]
+                eatery_to_events.setdefault(eatery_id, []).append(
+                    (get_timestamp(start), get_timestamp(end), start, end)
+                )
+    return {eatery_id: OpenIntervals(events) for eatery_id, events in eatery_to_events.items()}
+
+
+def is_selected(info, *path):
+    """Returns whether the field being resolved selects the nested field at path, e.g. ("stations", "items").
+
+    Field names in path use the names of the GraphQL schema, not of the python types.
+    """
+    fields = info.field_asts
+    for name in path:
+        fields = [child for field in fields for child in get_fields(field.selection_set, info.fragments)]
+        fields = [field for field in fields if field.name.value == name]
+        if not fields:
+            return False
+    return True
+
+
+def get_fields(selection_set, fragments):
+    """Returns the fields of a selection set, including the fields of its fragments."""
+    fields = []
+    for selection in selection_set.selections if selection_set else []:
+        if isinstance(selection, Field):
+            fields.append(selection)
+        elif isinstance(selection, FragmentSpread):
+            fields += get_fields(fragments[selection.name.value].selection_set, fragments)
+        else:
+            fields += get_fields(selection.selection_set, fragments)
+    return fields
+
+
+def parse_date_range(start_date=None, end_date=None, days=None):
+    """Parses the date range arguments of an operatingHours field.
+
+    Returns a tuple of inclusive start and end ISO date strings, either of which is None if that side is unbounded, or
+    None if no argument was given.
+
+    Args:
+        start_date (string): the first date to include, as YYYY-MM-DD
+        end_date (string): the last date to include, as YYYY-MM-DD
+        days (int): the number of days to include, starting at start_date or today; ignored if end_date is given
+    """
+    if start_date is None and end_date is None and days is None:
+        return None
+
+    start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date is not None else None
+    end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date is not None else None
+    if end is None and days is not None:
+        start = get_today() if start is None else start
+        end = start + timedelta(days=days - 1)
+
+    return (
+        None if start is None else start.isoformat(),
+        None if end is None else end.isoformat(),
+    )
+
+
+def date_criteria(column, start_date, end_date):
+    """Returns the filters that limit a date column to an inclusive range of ISO date strings."""
+    criteria = []
+    if start_date is not None:
+        criteria.append(column >= start_date)
+    if end_date is not None:
+        criteria.append(column <= end_date)
+    return criteria
+
+
+def payment_method_criteria(model, payment_methods):
+    """Returns the filters that limit eateries of a model to those accepting every one of the given payment methods.
+
+    Args:
+        model (Base): CampusEatery or CollegetownEatery
+        payment_methods (list): values of PaymentMethodsEnum
+    """
+    columns = {
+        PaymentMethodsEnum.BRB.value: model.payment_method_brbs,
+        PaymentMethodsEnum.CASH.value: model.payment_method_cash,
+        PaymentMethodsEnum.CORNELL_CARD.value: model.payment_method_cornell_card,
+        PaymentMethodsEnum.CREDIT.value: model.payment_method_credit,
+        PaymentMethodsEnum.MOBILE.value: model.payment_method_mobile,
+        PaymentMethodsEnum.SWIPES.value: model.payment_method_swipes,
+    }
+    return [columns[getattr(method, "value", method)].is_(True) for method in payment_methods or []]
+
+
+def fetch_ids(model, criteria):
+    """Queries db for the ids of the rows of a table that match every one of the given filters.
+
+    Returns a set of ids.
+    """
+    query = model.query.with_entities(model.id).filter(*criteria)
+    return {row[0] for row in get_connection().execute(query.statement)}
+
+
 def parse_coordinates(eatery):
     """Parses the coordinates of an eatery.
 
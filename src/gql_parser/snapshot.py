@@ -0,0 +1,142 @@
+from threading import Lock, Thread
+from time import time
+from types import MappingProxyType
+
+from sqlalchemy import func, inspect
+from sqlalchemy.exc import OperationalError
+
+from .campus_eatery import get_campus_eateries
+from .collegetown_eatery import get_collegetown_eateries
+from .common_eatery import fetch_ids
+from ..constants import SNAPSHOT_CHECK_INTERVAL
+from ..db import get_connection, pinned_db, reference_db
+from ..database import CampusEatery, CollegetownEatery, DataVersion, get_db_path
+
+
+class EaterySnapshot(object):
+    """Fully built campus and Collegetown eatery graphs for a single data generation.
+
+    A snapshot is never modified after it is built. Newer data is served by swapping in a new snapshot instead.
+    """
+
+    def __init__(self, generation, db_path, campus_eateries, collegetown_eateries):
+        self.generation = generation
+        self.db_path = db_path
+        self.db_reference = reference_db(db_path)
+        self.campus_eateries = tuple(campus_eateries)
+        self.campus_by_id = MappingProxyType({eatery.id: eatery for eatery in self.campus_eateries})
+        self.campus_by_slug = MappingProxyType({eatery.slug: eatery for eatery in self.campus_eateries})
+        self.collegetown_eateries = tuple(collegetown_eateries)
+        self.collegetown_by_id = MappingProxyType({eatery.id: eatery for eatery in self.collegetown_eateries})
+
+    def warm(self):
+        """Loads every lazily loaded field of the snapshot's eateries."""
+        loaders = {eatery.loader for eatery in self.campus_eateries + self.collegetown_eateries}
+        for loader in loaders:
+            loader.warm()
+
+    def get_campus_eateries(self, eatery_ids=None, criteria=None, open_now=None):
+        """Returns the campus eateries with the given ids, or all campus eateries if ids is None, that match every one
+        of the given filters on CampusEatery and, unless open_now is None, are open or closed right now.
+        """
+        return filter_eateries(self.campus_eateries, CampusEatery, self.db_path, eatery_ids, criteria, open_now)
+
+    def get_collegetown_eateries(self, eatery_ids=None, criteria=None, open_now=None):
+        """Returns the Collegetown eateries with the given ids, or all Collegetown eateries if ids is None, that match
+        every one of the given filters on CollegetownEatery and, unless open_now is None, are open or closed right now.
+        """
+        return filter_eateries(
+            self.collegetown_eateries, CollegetownEatery, self.db_path, eatery_ids, criteria, open_now
+        )
+
+
+def filter_eateries(eateries, model, db_path, eatery_ids, criteria, open_now):
+    """Filters the eateries of a snapshot by id, by querying the snapshot's db at db_path for the ids that match
+    criteria, and by whether they are open right now according to their open intervals.
+
+    Returns a list of eateries in snapshot order.
+    """
+    if eatery_ids is not None:
+        eatery_ids = set(eatery_ids)
+        eateries = [eatery for eatery in eateries if eatery.id in eatery_ids]
+    if criteria and eateries:
+        with pinned_db(db_path):
+            matching_ids = fetch_ids(model, criteria)
+        eateries = [eatery for eatery in eateries if eatery.id in matching_ids]
+    if open_now is not None:
+        now = time()
+        eateries = [eatery for eatery in eateries if eatery.loader.open_intervals(eatery.id).is_open(now) == open_now]
+    return list(eateries)
+
+
+_snapshot = None
+_last_check = 0
+_rebuild_lock = Lock()
+
+
+def get_current_generation():
+    """Queries db for the generation of the data it currently holds.
+
+    Returns 0 if the db has never been updated.
+    """
+    query = DataVersion.query.with_entities(func.max(DataVersion.id))
+    try:
+        return get_connection().execute(query.statement).scalar() or 0
+    except OperationalError:
+        return 0
+
+
+def build_snapshot(generation, warm=False):
+    """Builds the eatery graphs currently stored in the db.
+
+    Returns a new EaterySnapshot. Unless warm is True, fields like operating hours are only loaded once they are first
+    resolved. Eateries whose table is missing from the db, like Collegetown eateries before their first refresh, are
+    left out, so they don't keep the others from being served.
+    """
+    db_path = get_db_path()
+    with pinned_db(db_path):
+        inspector = inspect(get_connection())
+        campus_eateries = get_campus_eateries(None) if inspector.has_table(CampusEatery.__tablename__) else []
+        collegetown_eateries = (
+            get_collegetown_eateries(None) if inspector.has_table(CollegetownEatery.__tablename__) else []
+        )
+        snapshot = EaterySnapshot(generation, db_path, campus_eateries, collegetown_eateries)
+    if warm:
+        snapshot.warm()
+    return snapshot
+
+
+def get_snapshot():
+    """Returns the eatery snapshot of this process.
+
+    The first call builds the snapshot, leaving its heavy fields to be loaded on demand. Afterwards, the db is checked
+    for a new data generation at most every SNAPSHOT_CHECK_INTERVAL seconds, and a newer, fully loaded snapshot is
+    built in a background thread while the current one keeps being served.
+    """
+    global _last_check, _snapshot
+    snapshot = _snapshot
+    if snapshot is None:
+        with _rebuild_lock:
+            if _snapshot is None:
+                _last_check = time()
+                _snapshot = build_snapshot(get_current_generation())
+            return _snapshot
+
+    now = time()
+    if now - _last_check >= SNAPSHOT_CHECK_INTERVAL:
+        _last_check = now
+        generation = get_current_generation()
+        if generation != snapshot.generation and _rebuild_lock.acquire(blocking=False):
+            Thread(target=_rebuild_snapshot, args=(generation,), daemon=True).start()
+    return snapshot
+
+
+def _rebuild_snapshot(generation):
+    """Builds the snapshot of a new data generation and swaps it in. Expects _rebuild_lock to be held."""
+    global _snapshot
+    try:
+        _snapshot = build_snapshot(generation, warm=True)
+    except Exception as e:
+        print("Snapshot rebuild failed:", e)
+    finally:
+        _rebuild_lock.release()
@@ -7,7 +7,7 @@ from .expanded_menu_type import (
     DescriptiveFoodStationType,
     FoodCategoryType,
 )
-from .food_station_type import FoodItemType, FoodStationType
+from .food_station_type import FoodItemType, FoodStationType, set_favorites
 from .operating_hours_type import CollegetownEventType, CollegetownHoursType, EventType, OperatingHoursType
 from .payment_methods_type import PaymentMethodsEnum, PaymentMethodsType
 from .swipe_data_type import SwipeDataType
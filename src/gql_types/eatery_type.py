@@ -1,4 +1,5 @@
 from graphene import Boolean, Enum, Field, Float, Int, List, ObjectType, String
+from time import time
 
 from .expanded_menu_type import FoodCategoryType
 from .operating_hours_type import OperatingHoursType, CollegetownHoursType
@@ -37,6 +38,18 @@ class EateryBaseType(ObjectType):
     payment_methods = Field(PaymentMethodsType, required=True)
     payment_methods_enums = List(PaymentMethodsEnum, required=True)
     phone = String(required=True)
+    is_open = Boolean(required=True)
+    closes_at = String(required=False)  # <isodate>:<time>, null if closed
+    next_open = String(required=False)  # <isodate>:<time>, null if there are no later events
+
+    def resolve_is_open(self, info):
+        return self.loader.open_intervals(self.id).is_open(time())
+
+    def resolve_closes_at(self, info):
+        return self.loader.open_intervals(self.id).closes_at(time())
+
+    def resolve_next_open(self, info):
+        return self.loader.open_intervals(self.id).next_open(time())
 
 
 class CampusEateryType(EateryBaseType):
@@ -45,19 +58,32 @@ class CampusEateryType(EateryBaseType):
     expanded_menu = List(FoodCategoryType, required=True)
     location = String(required=True)
     name_short = String(required=True)
-    operating_hours = List(OperatingHoursType, required=True)
+    operating_hours = List(OperatingHoursType, required=True, start_date=String(), end_date=String(), days=Int())
     slug = String(required=True)
     swipe_data = List(SwipeDataType, required=True)
     exceptions = List(String, required=True)
     reserve_url = String(required=False)
     is_get = Boolean(required=True)
 
+    # heavy fields are loaded through the eatery's loader only when a query selects them
+    def resolve_expanded_menu(self, info):
+        return self.loader.expanded_menu(self.id, info)
+
+    def resolve_operating_hours(self, info, start_date=None, end_date=None, days=None):
+        return self.loader.operating_hours(self.id, info, start_date, end_date, days)
+
+    def resolve_swipe_data(self, info):
+        return self.loader.swipe_data(self.id, info)
+
 
 class CollegetownEateryType(EateryBaseType):
     address = String(required=True)
     categories = List(String, required=True)
-    operating_hours = List(CollegetownHoursType, required=True)
+    operating_hours = List(CollegetownHoursType, required=True, start_date=String(), end_date=String(), days=Int())
     price = String(required=True)
     rating = String(required=True)
     rating_enum = Field(RatingEnum, required=True)
     url = String(required=True)
+
+    def resolve_operating_hours(self, info, start_date=None, end_date=None, days=None):
+        return self.loader.operating_hours(self.id, info, start_date, end_date, days)
@@ -1,11 +1,33 @@
+from collections.abc import MutableMapping
 from graphene import Boolean, List, ObjectType, String
 
 
+def get_favorites_by_field(context):
+    """Returns the dict on the request context that maps root field names to the favorites passed to them."""
+    if isinstance(context, MutableMapping):
+        return context.setdefault("favorites", {})
+    if not hasattr(context, "favorites"):
+        context.favorites = {}
+    return context.favorites
+
+
+def set_favorites(info, favorites):
+    """Records the favorites passed to the root field being resolved so that its food items can look them up."""
+    if info.context is not None:
+        get_favorites_by_field(info.context)[info.path[0]] = frozenset(favorites or [])
+
+
 class FoodItemType(ObjectType):
     item = String(required=True)
     healthy = Boolean(required=True)
     favorite = Boolean(required=True)
 
+    def resolve_favorite(self, info):
+        # favorites vary per request, so they are overlaid on the shared menus instead of being stored in them
+        if info.context is None:
+            return False
+        return self.item in get_favorites_by_field(info.context).get(info.path[0], ())
+
     def equals(self, food_item):
         return self.item == food_item.item and self.healthy == food_item.healthy
 
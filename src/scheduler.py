@@ -0,0 +1,107 @@
+from datetime import datetime
+from heapq import heappop, heappush
+from queue import Queue
+import random
+from threading import Condition, Thread
+import time
+
+from .constants import (
+    CORNELL_DINING_URL,
+    REFRESH_INTERVALS,
+    SCHEDULER_JITTER,
+    SCHEDULER_RETRY_DELAY,
+    STATIC_ATTRIBUTES_URL,
+    STATIC_CTOWN_HOURS_URL,
+    STATIC_EATERIES_URL,
+    STATIC_EXPANDED_ITEMS_URL,
+    STATIC_MENUS_URL,
+)
+from .db import start_update
+
+
+class Job(object):
+    """A refresh of some upstream sources, run on its own cadence.
+
+    Args:
+        name (string): the name of the job, a key of REFRESH_INTERVALS
+        run (function): runs the job, returning False if it failed
+    """
+
+    def __init__(self, name, run):
+        self.name = name
+        self.run = run
+        self.interval = REFRESH_INTERVALS[name]
+        self.failures = 0
+
+    def next_delay(self):
+        """Returns the seconds to wait before the next run: the job's interval, or after a failure a delay doubling
+        with every consecutive failure, up to the interval. Either is postponed by up to SCHEDULER_JITTER of itself.
+        """
+        delay = self.interval
+        if self.failures:
+            delay = min(delay, SCHEDULER_RETRY_DELAY * 2 ** (self.failures - 1))
+        return delay * (1 + random.uniform(0, SCHEDULER_JITTER))
+
+
+def get_jobs():
+    """Returns a list of the Jobs refreshing each upstream source.
+
+    Every job runs a full update, which is skipped when its inputs haven't changed, and only requests its own sources
+    again; the others reuse the bodies kept by earlier updates.
+    """
+    static_sources = [STATIC_ATTRIBUTES_URL, STATIC_EATERIES_URL, STATIC_MENUS_URL]
+    return [
+        Job("cornell_dining", lambda: start_update(True, False, False, sources=[CORNELL_DINING_URL])),
+        Job("static_eateries", lambda: start_update(True, False, False, sources=static_sources)),
+        Job("expanded_items", lambda: start_update(True, False, False, sources=[STATIC_EXPANDED_ITEMS_URL])),
+        Job("swipe_data", lambda: start_update(False, True, False, sources=[])),
+        Job("collegetown", lambda: start_update(False, False, True, sources=[STATIC_CTOWN_HOURS_URL])),
+    ]
+
+
+class Scheduler(object):
+    """Runs jobs on their own cadences.
+
+    Due jobs are put on a queue consumed by a single worker thread, so updates run one at a time, and a job is only
+    scheduled again once its run has finished.
+
+    Args:
+        jobs (list): the Jobs to run, all of which are due at start, in order
+    """
+
+    def __init__(self, jobs):
+        self.queue = Queue()
+        self._condition = Condition()
+        self._due = []
+        now = time.time()
+        for i, job in enumerate(jobs):
+            heappush(self._due, (now + i, job.name, job))
+
+    def run_forever(self):
+        Thread(target=self._work, daemon=True).start()
+        while True:
+            with self._condition:
+                while not self._due or self._due[0][0] > time.time():
+                    self._condition.wait(self._due[0][0] - time.time() if self._due else None)
+                _, _, job = heappop(self._due)
+            self.queue.put(job)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            print("[{}] Running job {}".format(datetime.now(), job.name))
+            try:
+                succeeded = job.run()
+            except Exception as e:
+                print("Job {} failed: {}".format(job.name, e))
+                succeeded = False
+            job.failures = 0 if succeeded else job.failures + 1
+            delay = job.next_delay()
+            print(
+                "[{}] Job {} {}, next run in {:.0f}s".format(
+                    datetime.now(), job.name, "done" if succeeded else "failed", delay
+                )
+            )
+            with self._condition:
+                heappush(self._due, (time.time() + delay, job.name, job))
+                self._condition.notify()
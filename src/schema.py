@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from dateutil import parser
-from graphene import Field, Int, List, ObjectType, String
+from graphene import Boolean, Field, Int, List, ObjectType, String
 import pytz
 import requests
 
@@ -14,8 +14,15 @@ from .constants import (
     POSITIVE_TRANSACTION_TYPE,
     SWIPE_PLANS,
 )
-from .gql_types import AccountInfoType, CampusEateryType, CollegetownEateryType, TransactionType
-from .gql_parser import get_campus_eateries, get_collegetown_eateries
+from .gql_types import (
+    AccountInfoType,
+    CampusEateryType,
+    CollegetownEateryType,
+    PaymentMethodsEnum,
+    TransactionType,
+    set_favorites,
+)
+from .gql_parser import campus_eatery_criteria, collegetown_eatery_criteria, get_snapshot
 
 
 class Data(object):
@@ -31,22 +38,56 @@ class Data(object):
         Data.collegetown_eateries = collegetown_eateries
 
 
-class Query(ObjectType):
-    account_info = Field(AccountInfoType, session_id=String(name="id"))
-    campus_eateries = List(CampusEateryType, eatery_id=Int(name="id"), favorites=List(String, name="favorites"))
-    collegetown_eateries = List(CollegetownEateryType, eatery_id=Int(name="id"))
-    eateries = List(CampusEateryType, eatery_id=Int(name="id"), favorites=List(String, name="favorites"))
+def get_eatery_ids(eatery_id, eatery_ids):
+    """Combines the id and ids arguments of an eateries field.
+
+    Returns a list of ids, or None if neither argument was given.
+    """
+    if eatery_id is None and eatery_ids is None:
+        return None
+    return ([] if eatery_ids is None else list(eatery_ids)) + ([] if eatery_id is None else [eatery_id])
 
-    def resolve_campus_eateries(self, info, eatery_id=None, favorites=None):
-        favorites = [] if favorites is None else favorites
-        return get_campus_eateries(eatery_id, favorites)
 
-    def resolve_collegetown_eateries(self, info, eatery_id=None):
-        return get_collegetown_eateries(eatery_id)
+def campus_eatery_arguments():
+    """Returns the arguments of the campusEateries and eateries fields."""
+    return {
+        "eatery_id": Int(name="id"),
+        "eatery_ids": List(Int, name="ids"),
+        "campus_area": String(),
+        "eatery_type": String(),
+        "payment_methods": List(PaymentMethodsEnum),
+        "is_get": Boolean(),
+        "open_now": Boolean(),
+        "favorites": List(String, name="favorites"),
+    }
 
-    def resolve_eateries(self, info, eatery_id=None, favorites=None):
-        favorites = [] if favorites is None else favorites
-        return get_campus_eateries(eatery_id, favorites)
+
+class Query(ObjectType):
+    account_info = Field(AccountInfoType, session_id=String(name="id"))
+    campus_eateries = List(CampusEateryType, **campus_eatery_arguments())
+    collegetown_eateries = List(
+        CollegetownEateryType,
+        eatery_id=Int(name="id"),
+        eatery_ids=List(Int, name="ids"),
+        payment_methods=List(PaymentMethodsEnum),
+        price=String(),
+        open_now=Boolean(),
+    )
+    eateries = List(CampusEateryType, **campus_eatery_arguments())
+
+    def resolve_campus_eateries(self, info, eatery_id=None, eatery_ids=None, favorites=None, open_now=None, **filters):
+        set_favorites(info, favorites)
+        eatery_ids = get_eatery_ids(eatery_id, eatery_ids)
+        return get_snapshot().get_campus_eateries(eatery_ids, campus_eatery_criteria(**filters), open_now)
+
+    def resolve_collegetown_eateries(self, info, eatery_id=None, eatery_ids=None, open_now=None, **filters):
+        eatery_ids = get_eatery_ids(eatery_id, eatery_ids)
+        return get_snapshot().get_collegetown_eateries(eatery_ids, collegetown_eatery_criteria(**filters), open_now)
+
+    def resolve_eateries(self, info, eatery_id=None, eatery_ids=None, favorites=None, open_now=None, **filters):
+        set_favorites(info, favorites)
+        eatery_ids = get_eatery_ids(eatery_id, eatery_ids)
+        return get_snapshot().get_campus_eateries(eatery_ids, campus_eatery_criteria(**filters), open_now)
 
     def resolve_account_info(self, info, session_id=None):
         if session_id is None:
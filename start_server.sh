@@ -1 +1,2 @@
+python schedule_updates.py &
 gunicorn -c gunicorn.py app:app